@@ -0,0 +1,333 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Aggregate projects, builds and pull requests in a single pass over the dump.
+
+Every chunk of the dump is reduced to partial aggregates (counts, sums, maxima,
+first values, any/all), which merge with the partials of other chunks or of
+other worker processes. The merged partials are finalized into the tables of
+`projects.project_statistics`, `builds.build_statistics` and
+`pull_requests.pull_request_statistics`, and written to the cache together.
+
+With the partitioned dump (see `testmining.partition`), workers aggregate one
+project each; otherwise the CSV is aggregated chunk by chunk.
+
+With `--incremental`, the merged partials are kept in the cache as state,
+along with the highest job id and the length of the CSV they cover. Later runs
+only parse the jobs appended since, and merge them into the affected projects,
+builds and pull requests of the state.
+"""
+
+import hashlib
+import logging
+import os
+
+from collections import OrderedDict
+
+import click
+
+import pandas as pd
+
+from testmining import builds, cache, executor, loader, projects, pull_requests
+
+LOG = logging.getLogger(__file__)
+
+# Cache keys of the state of `refresh`
+STATE_KEYS = OrderedDict([
+    ('projects', 'aggregates.projects'),
+    ('builds', 'aggregates.builds'),
+    ('pull_requests', 'aggregates.pull_requests'),
+    ('commits', 'aggregates.commits'),
+])
+
+COLUMNS = list(OrderedDict.fromkeys(
+    builds.COLUMNS + projects.COLUMNS + [loader.COMMITS_FIELD]))
+
+PROJECT_AGGREGATIONS = OrderedDict([
+    ('jobs', 'sum'),
+    ('max_test_failures', 'max'),
+    ('test_failures', 'sum'),
+    ('test_duration_sum', 'sum'),
+    ('test_duration_count', 'sum'),
+    ('build_duration_sum', 'sum'),
+    ('build_duration_count', 'sum'),
+    ('last_job_id', 'max'),
+])
+
+# Projects in the state also know their builds and language, see `to_state`
+STATE_AGGREGATIONS = OrderedDict(PROJECT_AGGREGATIONS, builds='sum', gh_lang='first')
+
+PULL_REQUEST_AGGREGATIONS = OrderedDict([
+    ('has_failed_tests', 'any'),
+    ('failed_tests', 'sum'),
+    ('builds', 'sum'),
+])
+
+
+def partial(jobs):
+    """Reduce a chunk of jobs, as read by `loader.iter_jobs`, to mergeable aggregates."""
+    df = jobs.copy()
+    for column in loader.CATEGORICAL_FIELDS:
+        # Categories differ between chunks, which merging could not reconcile
+        df[column] = df[column].astype(object)
+    df['test_failures'] = builds.test_failures(df)
+
+    pr = df[df['gh_is_pr'].fillna(False).astype(bool)]
+    return {
+        'builds': builds.group_by_build(df).agg(builds.JOB_AGGREGATIONS),
+        'commits': loader.split_commits(df),
+        'projects': projects.group_by_project(df).agg(
+            jobs=('tr_job_id', 'size'),
+            max_test_failures=('tr_log_num_tests_failed', 'max'),
+            test_failures=('test_failures', 'sum'),
+            test_duration_sum=('tr_log_testduration', 'sum'),
+            test_duration_count=('tr_log_testduration', 'count'),
+            build_duration_sum=('tr_log_buildduration', 'sum'),
+            build_duration_count=('tr_log_buildduration', 'count'),
+            last_job_id=('tr_job_id', 'max'),
+        ),
+        'languages': df[['gh_project_name', 'gh_lang']].drop_duplicates(),
+        'pull_requests': pull_requests.group_by_pull_request(pr).agg(
+            has_failed_tests=('tr_log_bool_tests_failed', 'any'),
+            failed_tests=('tr_log_bool_tests_failed', 'sum'),
+            builds=('tr_job_id', 'size'),
+        ),
+    }
+
+
+def merge(partials):
+    """Combine partial aggregates, which have to be in the order of the dump."""
+    partials = list(partials)
+
+    def concat(name):
+        return pd.concat([p[name] for p in partials])
+
+    return {
+        'builds': concat('builds').groupby(level=0).agg(builds.JOB_AGGREGATIONS),
+        'commits': loader.concat_chunks([p['commits'] for p in partials]),
+        'projects': concat('projects').groupby(level=0).agg(PROJECT_AGGREGATIONS),
+        'languages': concat('languages').drop_duplicates(),
+        'pull_requests': concat('pull_requests').groupby(level=[0, 1])
+                         .agg(PULL_REQUEST_AGGREGATIONS),
+    }
+
+
+def to_state(merged):
+    """Turn merged partials into the state, which merges with the state of later jobs.
+
+    The state consists of the projects with sums and counts instead of
+    averages, the final builds, the pull requests without ratios, and the
+    commits of the builds.
+    """
+    build_statistics = builds.with_commit_counts(merged['builds'], merged['commits'])
+
+    languages = merged['languages'].groupby('gh_project_name')['gh_lang']
+    assert (languages.size() == 1).all(), 'Project has multiple programming languages assigned'
+
+    project_state = merged['projects'].copy()
+    project_state['builds'] = build_statistics.groupby('gh_project_name').size()
+    project_state['gh_lang'] = languages.first()
+    return {
+        'projects': project_state[list(STATE_AGGREGATIONS)],
+        'builds': build_statistics,
+        'pull_requests': merged['pull_requests'],
+        'commits': _sort_commits(merged['commits']),
+    }
+
+
+def merge_state(current, delta):
+    """Merge the state of new jobs into the current state.
+
+    Only the projects, builds and pull requests which the new jobs belong to
+    are aggregated again.
+    """
+    known = delta['builds'].index.isin(current['builds'].index)
+    delta_projects = delta['projects'].copy()
+    delta_projects['builds'] = delta['builds'][~known].groupby('gh_project_name').size() \
+        .reindex(delta_projects.index, fill_value=0)
+
+    languages = current['projects']['gh_lang'].reindex(delta_projects.index)
+    assert (languages.isna() | (languages == delta_projects['gh_lang'])).all(), \
+        'Project has multiple programming languages assigned'
+
+    return {
+        'projects': _merge_rows(current['projects'], delta_projects, STATE_AGGREGATIONS),
+        'builds': _merge_rows(current['builds'], delta['builds'], builds.AGGREGATIONS),
+        'pull_requests': _merge_rows(current['pull_requests'], delta['pull_requests'],
+                                     PULL_REQUEST_AGGREGATIONS),
+        'commits': _sort_commits(loader.concat_chunks([current['commits'], delta['commits']])),
+    }
+
+
+def _sort_commits(commits):
+    # Like `builds.build_commits`: jobs, and thereby commits, are in the order of the dump
+    return commits.sort_values('tr_build_id', kind='stable', ignore_index=True)
+
+
+def _merge_rows(current, delta, aggregations):
+    touched = current.index.isin(delta.index)
+    levels = list(range(current.index.nlevels))
+    merged = pd.concat([current[touched], delta]).groupby(level=levels).agg(aggregations)
+    return pd.concat([current[~touched], merged]).sort_index()
+
+
+def statistics(state):
+    """Compute the tables of projects, builds, pull requests and commits from the state.
+
+    :return: a tuple of four DataFrames
+    """
+    project_state = state['projects']
+    project_statistics = pd.DataFrame({
+        'jobs': project_state['jobs'],
+        'builds': project_state['builds'],
+        'max_test_failures': project_state['max_test_failures'],
+        'test_failures': project_state['test_failures'],
+        'gh_lang': project_state['gh_lang'],
+        'avg_test_duration':
+            project_state['test_duration_sum'] / project_state['test_duration_count'],
+        'avg_build_duration':
+            project_state['build_duration_sum'] / project_state['build_duration_count'],
+    })
+    project_statistics.index.name = 'gh_project_name'
+    project_statistics['relative_failed_jobs'] = \
+        project_statistics['test_failures'] / project_statistics['jobs']
+
+    pull_request_statistics = state['pull_requests'].copy()
+    pull_request_statistics['relative_failed_tests'] = \
+        pull_request_statistics['failed_tests'] / pull_request_statistics['builds']
+
+    return project_statistics, state['builds'], pull_request_statistics, state['commits']
+
+
+def finalize(merged):
+    """Compute the tables of projects, builds, pull requests and commits from merged partials.
+
+    :return: a tuple of four DataFrames, see `statistics`
+    """
+    return statistics(to_state(merged))
+
+
+def _project_partial(filename, project_name):
+    where = {'gh_project_name': project_name}
+    return partial(next(loader.iter_jobs(filename, COLUMNS, where=where)))
+
+
+def aggregate(filename, chunksize=loader.DUMP_CHUNKSIZE, jobs=1):
+    """Aggregate the dump in a single pass.
+
+    :return: a tuple of four DataFrames, see `statistics`
+    """
+    return finalize(merge(_partials(filename, chunksize, jobs)))
+
+
+def _partials(filename, chunksize, jobs):
+    project_names = loader.partitioned_projects(filename)
+    if project_names is not None:
+        tasks = [(name, (filename, name)) for name in project_names]
+        return executor.run(_project_partial, tasks, jobs)
+    if jobs != 1:
+        LOG.info('Aggregating the CSV in one process, partition the dump for parallelism')
+    return [partial(chunk) for chunk in loader.iter_jobs(filename, COLUMNS, chunksize)]
+
+
+def refresh(filename, chunksize=loader.DUMP_CHUNKSIZE, jobs=1):
+    """Bring the state up to date with the jobs appended to the dump since the last refresh.
+
+    Appended jobs are expected to have higher job ids than the jobs before. If
+    there is no state yet, or the dump changed other than by appending, the
+    whole dump is aggregated.
+
+    :return: a tuple of four DataFrames, see `statistics`
+    """
+    length = os.path.getsize(filename)
+    current, progress = read_state(filename)
+    if current is None:
+        LOG.info("Aggregating all of '%s'", filename)
+        current = to_state(merge(_partials(filename, chunksize, jobs)))
+    else:
+        LOG.info("Aggregating jobs after %d, %d bytes into '%s'",
+                 progress['watermark'], progress['length'], filename)
+        partials = [partial(chunk) for chunk in loader.iter_jobs(filename, COLUMNS, chunksize,
+                                                                 since=progress['watermark'],
+                                                                 offset=progress['length'])
+                    if len(chunk)]
+        if not partials:
+            LOG.info('Aggregates are up to date')
+            return statistics(current)
+        current = merge_state(current, to_state(merge(partials)))
+    write_state(filename, current, length)
+    return statistics(current)
+
+
+def read_state(filename):
+    """Read the state of the last refresh, if the dump was only appended to since.
+
+    :return: a pair of the state and its progress, or (None, None)
+    """
+    try:
+        progress = [cache.entry_provenance(key) for key in STATE_KEYS.values()]
+    except KeyError:
+        return None, None
+    if any(p != progress[0] for p in progress):
+        LOG.warning('State is incomplete, it was not written entirely')
+        return None, None
+    progress = progress[0]
+    if os.path.abspath(filename) != progress['dump'] \
+            or os.path.getsize(filename) < progress['length'] \
+            or _tail_digest(filename, progress['length']) != progress['tail']:
+        LOG.warning("State does not match '%s', which changed other than by appending", filename)
+        return None, None
+    return {name: cache.read(key) for name, key in STATE_KEYS.items()}, progress
+
+
+def write_state(filename, state, length):
+    """Store the state, which covers the first `length` bytes of the dump."""
+    progress = {
+        'function': 'testmining.aggregates.refresh',
+        'dump': os.path.abspath(filename),
+        'length': length,
+        'tail': _tail_digest(filename, length),
+        'watermark': int(state['projects']['last_job_id'].max()),
+    }
+    for name, key in STATE_KEYS.items():
+        indexed = ['tr_build_id'] if name == 'commits' else ['gh_project_name']
+        cache.write(key, state[name], progress, indexed=indexed, persistent=True)
+
+
+def _tail_digest(filename, length, size=1 << 12):
+    """Digest of the bytes right before `length`, which detects a rewritten dump cheaply."""
+    with open(filename, 'rb') as f:
+        f.seek(max(length - size, 0))
+        return hashlib.sha1(f.read(min(length, size))).hexdigest()
+
+
+def write(filename, tables):
+    """Cache the tables of `statistics` under their well-known keys."""
+    project_statistics, build_statistics, pull_request_statistics, commits = tables
+    provenance = {'function': 'testmining.aggregates.aggregate', 'inputs': [cache.source(filename)]}
+    cache.write(projects.KEY_PROJECTS, project_statistics, provenance,
+                indexed=['gh_project_name'], dump=filename)
+    cache.write(builds.KEY_BUILDS, build_statistics, provenance,
+                indexed=['gh_project_name'], dump=filename)
+    cache.write(pull_requests.KEY_PULL_REQUESTS, pull_request_statistics, provenance,
+                indexed=['gh_project_name'], dump=filename)
+    cache.write(builds.KEY_COMMITS, commits, provenance, indexed=['tr_build_id'], dump=filename)
+
+
+@click.command(help=__doc__)
+@click.option('-f', '--filename', help='Location of TravisTorrent CSV', required=True)
+@click.option('--chunksize', default=loader.DUMP_CHUNKSIZE, show_default=True,
+              help='Rows parsed at once')
+@click.option('--incremental', is_flag=True,
+              help='Only aggregate jobs appended since the last incremental run')
+@executor.jobs_option
+def main(filename, chunksize, incremental, jobs):
+    if incremental:
+        write(filename, refresh(filename, chunksize, jobs))
+    else:
+        write(filename, aggregate(filename, chunksize, jobs))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
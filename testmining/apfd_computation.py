@@ -4,8 +4,14 @@
 For each project, compute and cache APFD scores in one CSV.
 
 The CSV has one row for every job, and the columns consist of the strategies.
+
+A manifest next to the CSV records size, modification time and checksum of
+every strategy file that contributed a column. Only new or changed strategies
+are recomputed, and the CSV is updated after every strategy, such that an
+interrupted run resumes where it stopped.
 """
 
+import json
 import logging
 import os
 
@@ -13,33 +19,135 @@ import click
 
 import pandas as pd
 
-from testmining import folders, apfd
+from testmining import folders, apfd, executor, util
 
 LOG = logging.getLogger(__file__)
 
 
-def process_project(project_name, project_folder):
-    results = []
-    strategies = []
-    for name, path in folders.strategies(project_folder):
-        strategies.append(name)
-        results.append(apfd.from_file(path))
-    df = pd.concat(results, axis=1, keys=strategies)
-    write(project_name, project_folder, df)
+def process_project(project_name, project_folder, chunksize=None, jobs=1, force=False):
+    process_projects([(project_name, project_folder)], chunksize, jobs, force)
+
+
+def process_projects(projects, chunksize=None, jobs=1, force=False):
+    """Compute APFD scores for new or changed strategies of all given projects.
+
+    The strategies of all projects are distributed to the workers at once, so
+    that small projects do not leave workers idle.
+    """
+    states = {}
+    stale = []
+    for name, folder in projects:
+        strategies = folders.strategies(folder)
+        table, manifest = read(folder, strategies, force)
+        states[name] = (folder, strategies, table, manifest)
+        changed = [(name, strategy, path) for strategy, path in strategies
+                   if not is_current(manifest, strategy, path)]
+        if table is not None and not changed:
+            LOG.info('All strategies of %s are up to date', name)
+            write(name, folder, strategies, table, manifest)
+        stale.extend(changed)
+
+    tasks = [('%s %s' % (name, strategy), (path, chunksize)) for name, strategy, path in stale]
+    results = executor.iter_run(apfd.from_file, tasks, jobs)
+    for (name, strategy, path), scores in zip(stale, results):
+        folder, strategies, table, manifest = states[name]
+        table = merge(table, strategy, scores)
+        manifest[strategy] = fingerprint(path)
+        write(name, folder, strategies, table, manifest)
+        states[name] = (folder, strategies, table, manifest)
+
+
+def read(project_folder, strategies, force=False):
+    """Read the APFD table and manifest of a project.
+
+    Columns and manifest entries of strategies which no longer exist are
+    dropped. Strategies without a column are removed from the manifest.
+
+    :return: the APFD table (None if absent or forced) and the manifest
+    """
+    path = folders.apfd(project_folder)
+    manifest_path = folders.apfd_manifest(project_folder)
+    if force or not os.path.exists(path) or not os.path.exists(manifest_path):
+        return None, {}
+
+    table = pd.read_csv(path, index_col='travisJobId')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    names = [strategy for strategy, _ in strategies]
+    table = table[[column for column in table.columns if column in names]]
+    manifest = {strategy: entry for strategy, entry in manifest.items()
+                if strategy in table.columns}
+    return table, manifest
+
+
+def fingerprint(path, digest=None):
+    path = folders.origin(path)
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha1': digest or util.file_digest(path),
+    }
+
+
+def is_current(manifest, strategy, path):
+    """Does the manifest entry still describe the strategy file?
+
+    Size and modification time are compared first; only if the modification
+    time differs, the content checksum decides. A touched, but unchanged file
+    updates the manifest entry in place.
+    """
+    entry = manifest.get(strategy)
+    if entry is None:
+        return False
+
+    path = folders.origin(path)
+    stat = os.stat(path)
+    if entry['path'] != os.path.abspath(path) or entry['size'] != stat.st_size:
+        return False
+    if entry['mtime'] == stat.st_mtime:
+        return True
+
+    digest = util.file_digest(path)
+    if entry['sha1'] == digest:
+        manifest[strategy] = fingerprint(path, digest)
+        return True
+    return False
+
+
+def merge(table, strategy, scores):
+    scores = scores.rename(strategy)
+    if table is None:
+        return scores.to_frame()
+    table = table.drop(columns=strategy, errors='ignore')
+    return pd.concat([table, scores], axis=1)
+
+
+def write(project_name, project_folder, strategies, table, manifest):
+    columns = [strategy for strategy, _ in strategies if strategy in table.columns]
+    table = table[columns]
+    table.index.name = 'travisJobId'
 
+    path = folders.apfd(project_folder)
+    with util.atomic_output(path) as temporary:
+        table.to_csv(temporary)
 
-def write(project_name, project_folder, df):
-    filename = '%s-apfd.csv' % project_name
-    path = os.path.join(folders.evaluation(project_folder), filename)
-    df.to_csv(path)
-    LOG.info('Written %s', path)
+    with util.atomic_output(folders.apfd_manifest(project_folder)) as temporary:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    LOG.info('Written %s (%s)', path, project_name)
 
 
 @click.command(help=__doc__)
-def main():
+@click.option('--chunksize', type=int,
+              help='Stream strategy CSVs in chunks of this many rows to bound memory')
+@click.option('--force', is_flag=True, help='Recompute all strategies')
+@executor.jobs_option
+def main(chunksize, force, jobs):
     logging.basicConfig(level=logging.INFO)
-    for name, folder in folders.projects():
-        process_project(name, folder)
+    process_projects(folders.projects(), chunksize, jobs, force)
 
 
 if __name__ == '__main__':
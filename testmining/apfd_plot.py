@@ -8,12 +8,14 @@ as bar, boxplot, or ridgeline chart.
 import logging
 import os
 
+from functools import partial
+
 import click
 
 import altair as alt
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 
 # Strategies appear in this order in all plots
 STRATEGIES = [
@@ -199,12 +201,15 @@ def read_apfd(project_path, strategies=None):
     return df
 
 
-def _main(strategies, plot_method):
+def _plot_project(project_name, project_path, strategies, plot_method):
+    LOG.info('Processing project %s', project_name)
+    df = read_apfd(project_path, strategies)
+    plot_method(project_name, project_path, df)
+
+
+def _main(strategies, plot_method, jobs=1):
     logging.basicConfig(level=logging.INFO)
-    for project_name, project_path in folders.projects():
-        LOG.info('Processing project %s', project_name)
-        df = read_apfd(project_path, strategies)
-        plot_method(project_name, project_path, df)
+    executor.map_projects(_plot_project, strategies, plot_method, jobs=jobs)
 
 
 def collect_apfd(strategies=None):
@@ -221,26 +226,24 @@ def cli():
 
 @cli.command()
 @click.argument('strategies', nargs=-1)
-def bars(strategies):
-    _main(strategies, save_bar_chart)
+@executor.jobs_option
+def bars(strategies, jobs):
+    _main(strategies, save_bar_chart, jobs)
 
 
 @cli.command()
 @click.argument('strategies', nargs=-1)
-def boxes(strategies):
-    _main(strategies, save_box_plot)
+@executor.jobs_option
+def boxes(strategies, jobs):
+    _main(strategies, save_box_plot, jobs)
 
 
 @cli.command()
 @click.argument('strategies', nargs=-1)
 @click.option('--interpolate', help='values from Altair interpolate enum')
-def ridgelines(strategies, interpolate):
-
-    def cmd(*args):
-        save_ridgeline(*args,
-                       interpolate=interpolate)
-
-    _main(strategies, cmd)
+@executor.jobs_option
+def ridgelines(strategies, interpolate, jobs):
+    _main(strategies, partial(save_ridgeline, interpolate=interpolate), jobs)
 
 
 @cli.command()
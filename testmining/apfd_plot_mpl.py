@@ -15,7 +15,7 @@ import matplotlib.pyplot as plt
 
 from matplotlib.ticker import PercentFormatter
 
-from testmining import folders
+from testmining import folders, executor
 from testmining.apfd_plot import read_apfd, collect_apfd
 
 LOG = logging.getLogger(__name__)
@@ -56,13 +56,17 @@ def cli():
     pass
 
 
+def _project_boxplot(project_name, project_path, strategies):
+    df = read_apfd(project_path, strategies)
+    output = os.path.join(folders.evaluation(project_path), 'boxplot.pdf')
+    save_boxplot(project_name, df, strategies, output)
+
+
 @cli.command()
 @click.argument('strategies', nargs=-1)
-def boxplot(strategies):
-    for project_name, project_path in folders.projects():
-        df = read_apfd(project_path, strategies)
-        output = os.path.join(folders.evaluation(project_path), 'boxplot.pdf')
-        save_boxplot(project_name, df, strategies, output)
+@executor.jobs_option
+def boxplot(strategies, jobs):
+    executor.map_projects(_project_boxplot, strategies, jobs=jobs)
 
 
 @cli.command()
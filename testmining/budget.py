@@ -14,7 +14,7 @@ import click
 import altair as alt
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 from testmining.apfd import read_tests
 
 LOG = logging.getLogger(__file__)
@@ -75,26 +75,27 @@ def cli():
     pass
 
 
+def _project_budgets(project_name, project_path):
+    tests = read_tests(folders.strategy(project_path, 'optimal-failure'))
+    budgets = compute_percent_detected(tests)
+    df = pd.melt(budgets, var_name='budget', value_name='faultsDetected')
+    df['project'] = project_name
+    return df
+
+
 @cli.command()
-def main():
+@executor.jobs_option
+def main(jobs):
     logging.basicConfig(level=logging.INFO)
-    for project_name, project_path in folders.projects():
-        save_chart(project_name, project_path)
+    executor.map_projects(save_chart, jobs=jobs)
 
 
 @cli.command()
 @click.option('--output', required=True)
-def combined(output):
+@executor.jobs_option
+def combined(output, jobs):
     logging.basicConfig(level=logging.INFO)
-    frames = []
-    for project_name, project_path in folders.projects():
-        tests = read_tests(folders.strategy(project_path, 'optimal-failure'))
-        budgets = compute_percent_detected(tests)
-        df = pd.melt(budgets, var_name='budget', value_name='faultsDetected')
-        df['project'] = project_name
-        frames.append(df)
-
-    df = pd.concat(frames)
+    df = pd.concat(executor.map_projects(_project_budgets, jobs=jobs))
     alt.Chart(df).mark_bar().encode(
         x='budget:O',
         y='mean(faultsDetected):Q',
@@ -13,48 +13,105 @@ import click
 from testmining import loader, cache
 
 KEY_BUILDS = 'builds'
+KEY_COMMITS = 'commits'
+
+# Columns of the dump which the aggregation reads
+COLUMNS = [
+    'tr_build_id',
+    'tr_job_id',
+    'tr_build_number',
+    'gh_project_name',
+    'gh_lang',
+    'gh_pull_req_num',
+    'gh_is_pr',
+    'git_branch',
+    'gh_build_started_at',
+    'tr_log_bool_tests_ran',
+    'tr_log_bool_tests_failed',
+    'tr_duration',
+    'tr_log_testduration',
+    'tr_log_buildduration',
+]
+
+
+AGGREGATIONS = OrderedDict([
+
+    # Presumably identical for all jobs in this build
+    ('tr_build_number', 'first'),
+    ('gh_project_name', 'first'),
+    ('gh_lang', 'first'),
+    ('gh_pull_req_num', 'first'),
+    ('gh_is_pr', 'all'),
+    ('git_branch', 'first'),
+    ('git_num_all_built_commits', 'sum'),
+    ('gh_build_started_at', 'first'),
+
+    # True aggregates
+    ('test_failures', 'any'),
+    ('tr_duration', 'sum'),
+    ('tr_log_testduration', 'sum'),
+    ('tr_log_buildduration', 'sum'),
+])
+
+# Aggregations of jobs, whose commits are counted in the table of `build_commits`
+JOB_AGGREGATIONS = OrderedDict((column, function) for column, function in AGGREGATIONS.items()
+                               if column != 'git_num_all_built_commits')
 
 
 def group_by_build(data):
     return data.groupby('tr_build_id')
 
 
-def build_statistics(data):
+def test_failures(data):
+    """Important: count only failures of tests which actually ran."""
+    return data['tr_log_bool_tests_ran'] & data['tr_log_bool_tests_failed']
+
+
+@cache.memoize(KEY_BUILDS, indexed=['gh_project_name'])
+def build_statistics(data, commits=None):
+    """Aggregate jobs per build.
+
+    Builds only count their commits, which are listed by `build_commits`.
+
+    :param data: the jobs, as read by `loader.read_dump` or `loader.read_jobs`
+    :param commits: the exploded commits of `loader.read_jobs`, if `data` lacks them
+    """
     df = data.copy()
+    df['test_failures'] = test_failures(df)
+    if commits is None:
+        commits = loader.split_commits(df)
+
+    return with_commit_counts(group_by_build(df).agg(JOB_AGGREGATIONS), commits)
 
-    # Important: count only failures of tests which actually ran
-    df['test_failures'] = df['tr_log_bool_tests_ran'] & df['tr_log_bool_tests_failed']
 
-    groups = group_by_build(df)
+def with_commit_counts(statistics, commits):
+    """Add how many commits the jobs of every build built, duplicates included."""
+    statistics = statistics.copy()
+    statistics['git_num_all_built_commits'] = commits.groupby('tr_build_id').size() \
+        .reindex(statistics.index, fill_value=0)
+    return statistics[list(AGGREGATIONS)]
 
-    aggregations = OrderedDict([
 
-        # Presumably identical for all jobs in this build
-        ('tr_build_number', 'first'),
-        ('gh_project_name', 'first'),
-        ('gh_lang', 'first'),
-        ('gh_pull_req_num', 'first'),
-        ('gh_is_pr', 'all'),
-        ('git_branch', 'first'),
-        ('git_all_built_commits', 'sum'),
-        ('gh_build_started_at', 'first'),
+@cache.memoize(KEY_COMMITS, indexed=['tr_build_id'])
+def build_commits(data):
+    """Relate builds and jobs to the commits they built, like the `tr_all_built_commits` view.
 
-        # True aggregates
-        ('test_failures', 'any'),
-        ('tr_duration', 'sum'),
-        ('tr_log_testduration', 'sum'),
-        ('tr_log_buildduration', 'sum'),
-    ])
+    There is one row per job and commit, sorted by build and in the order of the
+    dump otherwise, and commit ids are interned as categories.
 
-    return groups.agg(aggregations)
+    :param data: the jobs, or their exploded commits as read by `loader.read_jobs`
+    """
+    commits = data if 'git_commit' in data else loader.split_commits(data)
+    return commits[['tr_build_id', 'tr_job_id', 'git_commit']] \
+        .sort_values('tr_build_id', kind='stable', ignore_index=True)
 
 
 @click.command(help=__doc__)
 @click.option('-f', '--filename', help='Location of TravisTorrent CSV', required=True)
 def main(filename):
-    data = loader.read_dump(filename)
-    statistics = build_statistics(data)
-    cache.write(KEY_BUILDS, statistics)
+    data, commits = loader.read_jobs(filename, columns=COLUMNS, with_commits=True)
+    build_statistics(data, commits)
+    build_commits(commits)
 
 
 if __name__ == '__main__':
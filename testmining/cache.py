@@ -1,33 +1,509 @@
 # -*- encoding: utf-8 -*-
+
+"""
+File-based cache of DataFrames, which works like a dictionary.
+
+Every entry lives in its own Parquet file, named after a digest of what produced
+it: the function, a digest of its inputs and its parameters. An index next to
+the entries records for every entry its provenance, creation and access time,
+and size, and maps the well-known keys (like 'projects' or 'builds') to the
+latest entry written under that name.
+
+Entries remember the TravisTorrent dump they were derived from, i.e., the dump
+which the `loader` read their inputs from, and are treated as missing once the
+dump changes, unless they are written as persistent.
+Because entries are whole files, overwriting one reclaims its space; `compact`
+drops stale and orphaned entries, and `evict` bounds the total size by
+discarding least recently used entries.
+
+Entries can be indexed by some of their columns: their rows are then stored
+sorted by these columns in small row groups, such that `read(key, where=...)`
+only touches the row groups (and columns) matching the query, e.g., the builds
+of a single project.
+
+Several processes may share the cache: entry files are written under a
+temporary name and renamed into place, and updates of the index happen under
+an exclusive file lock. Readers look up entries under a shared lock, and only
+update the index if the recorded access time of an entry is older than
+ACCESS_RESOLUTION, hence concurrent readers rarely wait for each other.
+
+The single-file store of earlier versions (`cache.hd5`) is still read, if a
+key is not present in the new store.
+"""
+
+import contextlib
+import copy
+import fcntl
+import functools
+import hashlib
+import json
 import logging
+import os
+import sys
+import time
+
+import click
+
 import pandas as pd
 
-from testmining import folders
+import pyarrow as pa
 
-"""
-Small file-based cache using PyTables, which works like a dictionary.
-"""
+from pyarrow import parquet
+
+from testmining import folders, util
 
 LOG = logging.getLogger(__file__)
 
 __all__ = [
     'read',
     'write',
+    'remove',
+    'entry_provenance',
+    'memoize',
+    'compact',
+    'evict',
 ]
 
+# Upper bound for the size of the cache in bytes, enforced after each write
+ENV_SIZE_LIMIT = 'PRIO_CACHE_LIMIT'
+
+ENTRY_EXTENSION = '.parquet'
+
+# Rows per row group of indexed entries, the unit which queries skip or read
+ROW_GROUP_SIZE = 1 << 14
+
+# Seconds within which repeated accesses of an entry are not recorded again
+ACCESS_RESOLUTION = 60
+
+
+def read(key, where=None, columns=None, max_age=None):
+    """Read the latest DataFrame written under `key`.
+
+    :param key: the name of the entry
+    :param where: dict of column or index name to a value or a list of values;
+                  only rows matching all of them are read
+    :param columns: the columns to read (the index is always included)
+    :param max_age: if given, treat entries older than this many seconds as missing
+    :raise KeyError: if there is no valid entry for this key
+    """
+    digest, entry = _use(key)
+    if entry is None:
+        return _read_legacy(key, where, columns)
+    if max_age is not None and entry['created'] < time.time() - max_age:
+        raise KeyError(key)
+    try:
+        return _read_entry(key, digest, where, columns)
+    except FileNotFoundError:
+        # Evicted by a concurrent process
+        raise KeyError(key) from None
+
+
+def write(key, df, provenance=None, indexed=None, persistent=False, dump=None):
+    """Store a DataFrame under `key`.
+
+    :param key: the name of the entry
+    :param df: the DataFrame
+    :param provenance: JSON-serializable description of how `df` was computed;
+                       if None, the entry is addressed by the content of `df`
+    :param indexed: column or index names which queries select rows by
+    :param persistent: keep the entry valid when the dump changes, e.g., for
+                       state which keeps track of the dump on its own
+    :param dump: the file which `df` was derived from; defaults to the
+                 TravisTorrent dump in the base folder
+    :return: the digest which addresses the entry
+    """
+    if provenance is None:
+        provenance = {'content': frame_digest(df)}
+    digest = _digest({'key': key, 'provenance': provenance})
+    dumps = None if persistent else _versions([dump or folders.travis_torrent()])
+    _write_entry(digest, key, df, provenance, indexed, replace=True, dumps=dumps)
+    return digest
+
+
+def remove(key):
+    """Remove the entry written under `key`.
+
+    :return: True if there was an entry
+    """
+    with _index() as index:
+        digest = index['keys'].get(key)
+        if digest is None:
+            return False
+        _remove_entry(index, digest)
+        return True
+
+
+def entry_provenance(key):
+    """Get the provenance of the latest DataFrame written under `key`.
+
+    :raise KeyError: if there is no valid entry for this key
+    """
+    index = _read_index(folders.cache_index())
+    entry = index['entries'].get(index['keys'].get(key))
+    if entry is None or not _is_valid(entry):
+        raise KeyError(key)
+    return entry['provenance']
+
+
+def memoize(key, indexed=None):
+    """Decorate a function of DataFrames to cache its result under `key`.
+
+    The result is reused, if the function is called again with the same inputs
+    and parameters, and as long as the dump which the inputs were read from
+    did not change.
+
+    :param indexed: see `write`
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            provenance = {
+                'function': _qualified_name(func),
+                'inputs': [input_digest(value) for value in args],
+                'parameters': {name: input_digest(value) for name, value in sorted(kwargs.items())},
+            }
+            digest = _digest({'key': key, 'provenance': provenance})
+            if _use(key, digest)[1] is not None:
+                LOG.info("Reusing cached result of %s", provenance['function'])
+                try:
+                    return _read_entry(key, digest)
+                except FileNotFoundError:
+                    LOG.info("Cached result was evicted concurrently, recomputing")
+
+            origins = [_loaded_from(value) for value in list(args) + list(kwargs.values())
+                       if isinstance(value, pd.DataFrame)]
+            dumps = {origin['file']: origin['version'] for origin in origins if origin} \
+                or _versions([folders.travis_torrent()])
+
+            result = func(*args, **kwargs)
+            _write_entry(digest, key, result, provenance, indexed, replace=False, dumps=dumps)
+            return result
+        return wrapper
+    return decorator
+
+
+def _qualified_name(func):
+    # Scripts run with `python -m` have the module name '__main__'
+    module = sys.modules[func.__module__]
+    spec = getattr(module, '__spec__', None)
+    return '%s.%s' % (spec.name if spec else func.__module__, func.__qualname__)
+
+
+def input_digest(value):
+    """Identify an input of a memoized function.
+
+    DataFrames read by the `loader` are identified by the dump they stem
+    from (see `identify`), other DataFrames by their content.
+    """
+    if isinstance(value, pd.DataFrame):
+        origin = _loaded_from(value)
+        if origin is None:
+            return frame_digest(value)
+        return '%s:%s' % (origin['version'], origin['query'])
+    return repr(value)
+
+
+def identify(df, filename, query=''):
+    """Record that a DataFrame was read from `filename`, see `input_digest`.
+
+    :param query: what was read from the file, e.g., the selected columns
+    :return: `df`
+    """
+    df.attrs['source'] = {
+        'file': os.path.abspath(filename),
+        'version': source(filename),
+        'query': query,
+        'length': len(df),
+        'columns': list(df.columns),
+    }
+    return df
+
+
+def _loaded_from(df):
+    """Get what `identify` recorded, unless `df` was derived from the frame read.
+
+    Pandas passes `attrs` on to derived frames, e.g., the result of a mask or
+    `assign`; those differ in their length, columns or index.
+    """
+    origin = df.attrs.get('source')
+    if not isinstance(origin, dict) \
+            or len(df) != origin['length'] \
+            or list(df.columns) != origin['columns'] \
+            or not df.index.equals(pd.RangeIndex(len(df))):
+        return None
+    return origin
+
+
+def frame_digest(df):
+    """Compute a digest of the content of a DataFrame, including its index."""
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode('utf-8'))
+    digest.update(repr(df.dtypes.tolist()).encode('utf-8'))
+    try:
+        hashes = pd.util.hash_pandas_object(df)
+    except TypeError:
+        # Cells holding lists, like the commits of a build
+        hashes = pd.util.hash_pandas_object(df.applymap(repr))
+    digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def source(filename):
+    """Cheaply identify a version of the TravisTorrent dump (or any file)."""
+    if not os.path.exists(filename):
+        return None
+    stat = os.stat(filename)
+    return '%s:%d:%d' % (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
 
-def read(key):
+def entries():
+    """List all entries along with their metadata."""
+    index = _read_index(folders.cache_index())
+    rows = [dict(entry, digest=digest, valid=_is_valid(entry))
+            for digest, entry in index['entries'].items()]
+    columns = ['digest', 'key', 'created', 'accessed', 'size', 'indexed', 'valid']
+    df = pd.DataFrame(rows, columns=columns + ['provenance', 'dump'])
+    for column in ['created', 'accessed']:
+        df[column] = pd.to_datetime(df[column], unit='s')
+    return df
+
+
+def compact():
+    """Remove stale entries, and files which no entry refers to.
+
+    :return: the number of bytes freed
+    """
+    freed = 0
+    with _index() as index:
+        for digest, entry in list(index['entries'].items()):
+            if not _is_valid(entry):
+                freed += _remove_entry(index, digest)
+
+        # Entry files only appear while the index is locked, see `_write_entry`
+        known = {_entry_file(digest) for digest in index['entries']}
+        for filename in os.listdir(folders.cache_folder()):
+            path = os.path.join(folders.cache_folder(), filename)
+            if filename.endswith(ENTRY_EXTENSION) and path not in known:
+                LOG.info("Removing orphaned cache file '%s'", path)
+                freed += os.path.getsize(path)
+                os.remove(path)
+    return freed
+
+
+def evict(max_size):
+    """Remove least recently used entries until the cache is at most `max_size` bytes.
+
+    :return: the number of bytes freed
+    """
+    freed = 0
+    with _index() as index:
+        by_access = sorted(index['entries'].items(), key=lambda item: item[1]['accessed'])
+        total = sum(entry['size'] for _, entry in by_access)
+        for digest, _ in by_access:
+            if total - freed <= max_size:
+                break
+            freed += _remove_entry(index, digest)
+    return freed
+
+
+def _use(key, digest=None):
+    """Look up a valid entry, and record that it is used.
+
+    :param digest: the entry to point `key` to; if None, the entry which `key`
+                   points to
+    :return: a pair of the digest and the entry, or (None, None)
+    """
+    with _index(shared=True) as index:
+        if digest is None:
+            digest = index['keys'].get(key)
+        entry = index['entries'].get(digest)
+        if entry is None or not _is_valid(entry):
+            return None, None
+        update = index['keys'].get(key) != digest \
+            or entry['accessed'] < time.time() - ACCESS_RESOLUTION
+    if update:
+        with _index() as index:
+            entry = index['entries'].get(digest)
+            if entry is None:
+                return None, None
+            entry['accessed'] = time.time()
+            index['keys'][key] = digest
+    return digest, entry
+
+
+def _read_entry(key, digest, where=None, columns=None):
+    filename = _entry_file(digest)
+    LOG.info("Reading DF '%s' from '%s'", key, filename)
+    # Entry files are never modified in place, hence reading needs no lock
+    table = parquet.read_table(filename,
+                               columns=columns,
+                               filters=util.filters(where),
+                               use_pandas_metadata=True)
+    df = table.to_pandas()
+    for field in table.schema:
+        # Restore lists, which Arrow converts to arrays
+        if pa.types.is_list(field.type) and field.name in df:
+            df[field.name] = df[field.name].map(list, na_action='ignore')
+    return df
+
+
+def _write_entry(digest, key, df, provenance, indexed, replace, dumps):
+    """Store an entry, and point `key` to it.
+
+    With `replace`, the entry which `key` pointed to before is removed; else it
+    is kept for memoization until it is compacted or evicted.
+
+    :param dumps: dict of the files which `df` was derived from to their
+                  version (see `source`), or None if the entry is persistent
+    """
+    filename = _entry_file(digest)
+    LOG.info("Begin writing DF '%s' to '%s'", key, filename)
+    os.makedirs(folders.cache_folder(), exist_ok=True)
+    # Write outside the lock, but publish the file and its entry together
+    temporary = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        if indexed:
+            df = df.sort_values(list(indexed), kind='stable')
+        parquet.write_table(pa.Table.from_pandas(df), temporary,
+                            row_group_size=ROW_GROUP_SIZE if indexed else None)
+        with _index() as index:
+            os.replace(temporary, filename)
+            now = time.time()
+            previous = index['keys'].get(key)
+            index['entries'][digest] = {
+                'key': key,
+                'created': now,
+                'accessed': now,
+                'size': os.path.getsize(filename),
+                'provenance': provenance,
+                'indexed': list(indexed or []),
+                'dump': dumps,
+            }
+            index['keys'][key] = digest
+            if replace and previous is not None and previous != digest:
+                _remove_entry(index, previous)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    LOG.info("Completed writing DF '%s' to '%s'", key, filename)
+
+    limit = os.getenv(ENV_SIZE_LIMIT)
+    if limit:
+        evict(int(limit))
+
+
+def _remove_entry(index, digest):
+    entry = index['entries'].pop(digest)
+    for key, target in list(index['keys'].items()):
+        if target == digest:
+            del index['keys'][key]
+    filename = _entry_file(digest)
+    LOG.info("Removing cache entry '%s' (%s)", entry['key'], filename)
+    if os.path.exists(filename):
+        os.remove(filename)
+    return entry['size']
+
+
+def _is_valid(entry):
+    """Entries stay valid, until a dump they stem from changes."""
+    dumps = entry['dump']
+    if isinstance(dumps, str):
+        # Earlier versions only recorded the version of the dump in the base folder
+        dumps = {folders.travis_torrent(): dumps}
+    return all(source(filename) == version for filename, version in (dumps or {}).items())
+
+
+def _versions(filenames):
+    return {os.path.abspath(filename): source(filename) for filename in filenames}
+
+
+def _read_legacy(key, where=None, columns=None):
     filename = folders.cache()
+    if not os.path.exists(filename):
+        raise KeyError(key)
     LOG.info("Reading DF '%s' from '%s'", key, filename)
-    with pd.HDFStore(folders.cache()) as store:
+    with pd.HDFStore(filename, mode='r') as store:
+        if key not in store:
+            raise KeyError(key)
         df = store[key]
         LOG.info("Completed reading DF '%s' from '%s'", key, filename)
-        return df
+        return util.select(df, where, columns)
 
 
-def write(key, df):
-    filename = folders.cache()
-    LOG.info("Begin writing DF '%s' to '%s'", key, filename)
-    with pd.HDFStore(filename) as store:
-        store[key] = df
-    LOG.info("Completed writing DF '%s' to '%s'", key, filename)
+def _entry_file(digest):
+    return os.path.join(folders.cache_folder(), digest + ENTRY_EXTENSION)
+
+
+@contextlib.contextmanager
+def _index(shared=False):
+    """Lock the index for the duration of the block, and yield it for modification.
+
+    An exclusive lock on a separate file serializes all updates of the index
+    across processes; the index itself is replaced atomically, such that it is
+    never seen half-written, even after a crash.
+
+    :param shared: only look up the index, which other readers may do at the
+                   same time; changes are not written
+    """
+    filename = folders.cache_index()
+    if shared and not os.path.exists(filename):
+        # Nothing was cached yet, and lookups leave no trace
+        yield _read_index(filename)
+        return
+    os.makedirs(folders.cache_folder(), exist_ok=True)
+    with open(filename + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            index = _read_index(filename)
+            if shared:
+                yield index
+                return
+            before = copy.deepcopy(index)
+            yield index
+            if index != before:
+                _write_index(filename, index)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_index(filename):
+    if not os.path.exists(filename):
+        return {'entries': {}, 'keys': {}}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def _write_index(filename, index):
+    with util.atomic_output(filename) as temporary:
+        with open(temporary, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+@click.group(help=__doc__)
+def main():
+    pass
+
+
+@main.command('list', help='List cache entries')
+def list_entries():
+    print(entries().drop(columns=['provenance', 'dump']).to_string())
+
+
+@main.command('compact', help=compact.__doc__)
+def compact_cache():
+    LOG.info('Freed %d bytes', compact())
+
+
+@main.command('evict', help=evict.__doc__)
+@click.option('--max-size', type=int, required=True, help='Size limit in bytes')
+def evict_cache(max_size):
+    LOG.info('Freed %d bytes', evict(max_size))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,36 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Convert the strategy CSVs of all projects to memory-mappable Feather files.
+
+Readers of strategy files pick up the Feather file transparently, as long as it
+is newer than the CSV.
+"""
+
+import logging
+
+import click
+
+from testmining import folders, loader, executor
+
+LOG = logging.getLogger(__file__)
+
+
+def convert_project(project_path, force=False, jobs=1):
+    tasks = [(path, (path, force)) for _, path in folders.strategies(project_path)]
+    executor.run(loader.write_columnar, tasks, jobs)
+
+
+@click.command(help=__doc__)
+@click.option('--force', is_flag=True, help='Also convert up-to-date files')
+@executor.jobs_option
+def main(force, jobs):
+    logging.basicConfig(level=logging.INFO)
+    tasks = [(path, (path, force))
+             for _, project_path in folders.projects()
+             for _, path in folders.strategies(project_path)]
+    executor.run(loader.write_columnar, tasks, jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,8 @@ import os
 import click
 
 import altair as alt
-import pandas as pd
 
-from testmining import folders
+from testmining import folders, loader, executor
 
 
 LOG = logging.getLogger(__file__)
@@ -20,7 +19,7 @@ LOG = logging.getLogger(__file__)
 
 def duration_df(file):
     LOG.info('Reading %s', file)
-    df = pd.read_csv(file)['duration'].value_counts().to_frame()
+    df = loader.read_strategy(file, ['duration'])['duration'].value_counts().to_frame()
     return df.reset_index().rename(columns={
         'index': 'duration',
         'duration': 'count'
@@ -36,7 +35,7 @@ def duration_chart(project_name, file):
 
 
 def duration_per_test(project_name, file):
-    df = pd.read_csv(file)[['testName', 'duration', 'count']]
+    df = loader.read_strategy(file, ['testName', 'duration', 'count'])
     return alt.Chart(df, title=project_name).mark_point(filled=True).encode(
         x='duration',
         y='count',
@@ -56,20 +55,28 @@ def cli():
     logging.basicConfig(level=logging.INFO)
 
 
+def _distribution(project_name, project_path):
+    untreated = folders.strategy(project_path, 'untreated')
+    chart = duration_chart(project_name, untreated)
+    save(project_path, chart, 'distribution')
+
+
+def _scatter(project_name, project_path):
+    untreated = folders.strategy(project_path, 'untreated')
+    chart = duration_per_test(project_name, untreated)
+    save(project_path, chart, 'scatter')
+
+
 @cli.command()
-def distribution():
-    for project_name, project_path in folders.projects():
-        untreated = folders.strategy(project_path, 'untreated')
-        chart = duration_chart(project_name, untreated)
-        save(project_path, chart, 'distribution')
+@executor.jobs_option
+def distribution(jobs):
+    executor.map_projects(_distribution, jobs=jobs)
 
 
 @cli.command()
-def scatter():
-    for project_name, project_path in folders.projects():
-        untreated = folders.strategy(project_path, 'untreated')
-        chart = duration_per_test(project_name, untreated)
-        save(project_path, chart, 'scatter')
+@executor.jobs_option
+def scatter(jobs):
+    executor.map_projects(_scatter, jobs=jobs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,276 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Connect to the database with the TravisTorrent and GHTorrent tables.
+
+There are two backends, selected by the environment variable PRIO_DATABASE:
+
+- postgres (default): the server of `util.connection`
+- sqlite: an embedded database file in the base folder, which `load` creates
+  from the TravisTorrent CSV and the untreated strategies and patches of the
+  projects. It holds the tables `travistorrent_8_2_2017`, `tr_test_result`,
+  `tr_all_built_commits` and `raw_patches`, indexed for the queries of
+  `filter_jobs`, `patches` and `report`.
+
+The embedded `tr_test_result` only holds the test results of the untreated
+strategies, which only list red jobs: green jobs have no test results at all.
+Queries which tell red from green jobs by failing results, like
+`filter_jobs.query_offenders`, return the same jobs as on the server, whereas
+queries for jobs with any test results would only count red jobs; hence
+`report.failed_job_count_per_build` refuses to run on this backend.
+
+Queries are written for Postgres, with `%s` placeholders; `sql` and `cursor`
+adapt them to the backend of a connection.
+
+Results of expensive queries are kept in the cache (see `query`), by the
+normalized statement, its parameters and the version of the dataset: the
+embedded database file, or PRIO_DATASET for the server. PRIO_QUERY_TTL limits
+the age of reused results in seconds, and `invalidate` discards them.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+import click
+
+import pandas as pd
+
+from testmining import cache, folders, loader, util
+
+LOG = logging.getLogger(__file__)
+
+__all__ = [
+    'connect',
+    'query',
+    'invalidate',
+    'load',
+    'sql',
+    'cursor',
+]
+
+ENV_BACKEND = 'PRIO_DATABASE'
+
+# Version of the data on the server, part of the key of cached query results
+ENV_DATASET = 'PRIO_DATASET'
+DEFAULT_DATASET = 'travistorrent_8_2_2017'
+
+# Seconds after which cached query results are not reused anymore
+ENV_QUERY_TTL = 'PRIO_QUERY_TTL'
+
+QUERY_PREFIX = 'query.'
+
+POSTGRES = 'postgres'
+SQLITE = 'sqlite'
+
+# Tables which `load` fills from other files than the dump
+TABLES = [
+    'CREATE TABLE tr_all_built_commits (tr_job_id INTEGER, sha TEXT)',
+    'CREATE TABLE tr_test_result (tr_job_id INTEGER, testName TEXT, duration REAL, '
+    'count INTEGER, failures INTEGER, errors INTEGER, skipped INTEGER)',
+    'CREATE TABLE raw_patches (sha TEXT, name TEXT)',
+]
+
+INDEXES = [
+    'CREATE INDEX jobs_by_project ON travistorrent_8_2_2017 (gh_project_name, tr_build_number)',
+    'CREATE INDEX jobs_by_id ON travistorrent_8_2_2017 (tr_job_id)',
+    'CREATE INDEX commits_by_job ON tr_all_built_commits (tr_job_id)',
+    'CREATE INDEX test_results_by_job ON tr_test_result (tr_job_id)',
+    'CREATE INDEX patches_by_commit ON raw_patches (sha)',
+]
+
+TEST_RESULT_COLUMNS = {
+    'travisJobId': 'tr_job_id',
+    'testName': 'testName',
+    'duration': 'duration',
+    'count': 'count',
+    'failures': 'failures',
+    'errors': 'errors',
+    'skipped': 'skipped',
+}
+
+
+def backend():
+    return os.getenv(ENV_BACKEND) or POSTGRES
+
+
+def connect():
+    """Open a connection to the database of the configured backend."""
+    name = backend()
+    if name not in BACKENDS:
+        raise ValueError('Unknown database backend %r, use one of %s'
+                         % (name, ', '.join(BACKENDS)))
+    return BACKENDS[name]()
+
+
+def connect_sqlite(filename=None):
+    filename = filename or folders.database()
+    if not os.path.exists(filename):
+        raise FileNotFoundError("No database '%s', create it with "
+                                "`python -m testmining.database load`" % filename)
+    # Worker threads of `extraction` take turns with connections
+    return sqlite3.connect(filename, check_same_thread=False)
+
+
+BACKENDS = {
+    POSTGRES: util.connection,
+    SQLITE: connect_sqlite,
+}
+
+
+def is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def sql(conn, statement):
+    """Adapt a statement with `%s` placeholders to the parameter style of the connection."""
+    return statement.replace('%s', '?') if is_sqlite(conn) else statement
+
+
+@contextlib.contextmanager
+def cursor(conn):
+    """Open a cursor, which is closed after the block."""
+    if is_sqlite(conn):
+        with contextlib.closing(conn.cursor()) as c:
+            yield c
+        return
+    with conn.cursor() as c:
+        yield c
+
+
+def query(conn, statement, parameters=(), ttl=None):
+    """Run a query and return its result as DataFrame, or reuse the cached result.
+
+    :param statement: the query, see `sql`
+    :param parameters: the parameters of the query, which JSON can represent
+    :param ttl: seconds after which the cached result is not reused; defaults
+                to PRIO_QUERY_TTL, and else to no limit
+    """
+    provenance = {
+        'sql': ' '.join(statement.split()),
+        'parameters': list(parameters),
+        'dataset': dataset_version(conn),
+    }
+    digest = hashlib.sha1(json.dumps(provenance, sort_keys=True).encode('utf-8'))
+    key = QUERY_PREFIX + digest.hexdigest()
+    if ttl is None and os.getenv(ENV_QUERY_TTL):
+        ttl = float(os.getenv(ENV_QUERY_TTL))
+    if provenance['dataset'] is not None:
+        try:
+            return cache.read(key, max_age=ttl)
+        except KeyError:
+            pass
+
+    with cursor(conn) as c:
+        c.execute(sql(conn, statement), parameters)
+        result = pd.DataFrame(c.fetchall(), columns=[column[0] for column in c.description])
+    if provenance['dataset'] is not None:
+        cache.write(key, result, provenance)
+    return result
+
+
+def dataset_version(conn):
+    """Identify the data which a connection queries, or None for in-memory databases."""
+    if is_sqlite(conn):
+        filename = conn.execute('PRAGMA database_list').fetchone()[2]
+        return cache.source(filename) if filename else None
+    return os.getenv(ENV_DATASET) or DEFAULT_DATASET
+
+
+def invalidate(match=None):
+    """Discard cached query results, all or those whose statement contains `match`.
+
+    :return: the number of discarded results
+    """
+    entries = cache.entries()
+    discarded = 0
+    for key, provenance in zip(entries['key'], entries['provenance']):
+        if key.startswith(QUERY_PREFIX) and (match is None or match in provenance['sql']):
+            discarded += cache.remove(key)
+    return discarded
+
+
+def load(filename, dump, chunksize=loader.DUMP_CHUNKSIZE):
+    """Create the embedded database from the dump, and the files of all projects.
+
+    Test results are only loaded from the untreated strategies, hence only for
+    red jobs. The database replaces `filename` once complete.
+    """
+    LOG.info("Begin loading '%s' into '%s'", dump, filename)
+    with util.atomic_output(filename) as temporary:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        conn = sqlite3.connect(temporary)
+        try:
+            # Nothing to recover from: the file is discarded on failure
+            conn.execute('PRAGMA journal_mode = OFF')
+            conn.execute('PRAGMA synchronous = OFF')
+            for statement in TABLES:
+                conn.execute(statement)
+            _load_jobs(conn, dump, chunksize)
+            for project_name, project_path in folders.projects():
+                _load_project(conn, project_name, project_path, chunksize)
+            LOG.info('Creating indexes')
+            for statement in INDEXES:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+    LOG.info("Completed loading '%s'", filename)
+
+
+def _load_jobs(conn, dump, chunksize):
+    reader = pd.read_csv(dump, engine='c', dtype=loader.PARTITION_DTYPES, chunksize=chunksize)
+    for number, chunk in enumerate(reader):
+        chunk.to_sql('travistorrent_8_2_2017', conn, if_exists='append', index=False)
+        commits = loader.split_commits(chunk)
+        pd.DataFrame({
+            'tr_job_id': commits['tr_job_id'],
+            'sha': commits['git_commit'].astype(object),
+        }).to_sql('tr_all_built_commits', conn, if_exists='append', index=False)
+        LOG.info('Loaded %d jobs', (number + 1) * chunksize)
+
+
+def _load_project(conn, project_name, project_path, chunksize):
+    untreated = folders.strategy(project_path, 'untreated')
+    # The strategy is kept as CSV, or only in the permutation store
+    stored = folders.fresh_permutation(untreated) is not None
+    if os.path.exists(untreated) or stored:
+        LOG.info('Loading test results of %s', project_name)
+        columns = list(TEST_RESULT_COLUMNS)
+        for chunk in loader.read_strategy(untreated, columns=columns, chunksize=chunksize):
+            chunk.rename(columns=TEST_RESULT_COLUMNS).astype({'testName': object}) \
+                .to_sql('tr_test_result', conn, if_exists='append', index=False)
+
+    patches = folders.patches(project_path)
+    if os.path.exists(patches):
+        LOG.info('Loading patches of %s', project_name)
+        for chunk in pd.read_csv(patches, dtype=str, chunksize=chunksize):
+            chunk.to_sql('raw_patches', conn, if_exists='append', index=False)
+
+
+@click.group(help=__doc__)
+def main():
+    pass
+
+
+@main.command('load', help=load.__doc__)
+@click.option('-f', '--filename', help='Location of TravisTorrent CSV', required=True)
+@click.option('--chunksize', default=loader.DUMP_CHUNKSIZE, show_default=True,
+              help='Rows inserted at once')
+def load_database(filename, chunksize):
+    load(folders.database(), filename, chunksize)
+
+
+@main.command('invalidate', help=invalidate.__doc__)
+@click.option('--match', help='Text of the statements to discard, e.g., a table name')
+def invalidate_queries(match):
+    LOG.info('Discarded %d query results', invalidate(match))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
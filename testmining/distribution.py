@@ -13,7 +13,7 @@ import click
 import altair as alt
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 from testmining.apfd import read_tests
 
 LOG = logging.getLogger(__file__)
@@ -39,9 +39,9 @@ def plot(project_name, project_path):
 
 
 @click.command(help=__doc__)
-def main():
-    for project_name, project_path in folders.projects():
-        plot(project_name, project_path)
+@executor.jobs_option
+def main(jobs):
+    executor.map_projects(plot, jobs=jobs)
 
 
 if __name__ == '__main__':
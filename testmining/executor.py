@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Distribute per-project or per-strategy work to a pool of worker processes.
+
+Results are collected in the order of the tasks, regardless of which worker
+finishes first. A failing task raises TaskError, which names the task.
+"""
+
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from testmining import folders
+
+LOG = logging.getLogger(__file__)
+
+__all__ = [
+    'TaskError',
+    'jobs_option',
+    'run',
+    'iter_run',
+    'map_projects',
+]
+
+
+class TaskError(Exception):
+    """Processing a task, such as one project, raised an exception."""
+
+    def __init__(self, name, cause):
+        super().__init__('Processing %s failed: %r' % (name, cause))
+        self.name = name
+
+
+def jobs_option(func):
+    """Add the `--jobs` option to a click command."""
+    return click.option('--jobs', '-j',
+                        type=int,
+                        default=1,
+                        show_default=True,
+                        help='Number of worker processes, 0 for one per CPU')(func)
+
+
+def run(func, tasks, jobs=1):
+    """Call `func(*args)` for every task.
+
+    With more than one job, tasks are processed by a pool of processes, hence
+    `func` and its arguments have to be picklable (e.g., module-level functions
+    or `functools.partial` thereof, but no lambdas).
+
+    :param func: the function to apply
+    :param tasks: pairs of (task name, tuple of arguments)
+    :param jobs: the number of worker processes, 0 for one per CPU
+    :return: a list of results in the order of the tasks
+    """
+    return list(iter_run(func, tasks, jobs))
+
+
+def iter_run(func, tasks, jobs=1):
+    """Like `run`, but yield each result as soon as it and its predecessors are done."""
+    tasks = list(tasks)
+    workers = min(jobs or os.cpu_count(), len(tasks))
+
+    if workers <= 1:
+        for name, args in tasks:
+            yield _call(func, name, args)
+        return
+
+    LOG.info('Processing %d tasks with %d workers', len(tasks), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, *args) for _, args in tasks]
+        try:
+            for (name, _), future in zip(tasks, futures):
+                yield _result(name, future)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def map_projects(func, *args, jobs=1):
+    """Call `func(project_name, project_path, *args)` for every project.
+
+    :return: a list of results in the order of `folders.projects()`
+    """
+    tasks = [(name, (name, path) + args) for name, path in folders.projects()]
+    return run(func, tasks, jobs)
+
+
+def _call(func, name, args):
+    try:
+        return func(*args)
+    except Exception as e:
+        raise TaskError(name, e) from e
+
+
+def _result(name, future):
+    try:
+        return future.result()
+    except Exception as e:
+        raise TaskError(name, e) from e
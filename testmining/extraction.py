@@ -0,0 +1,183 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Extract data from the database per project, concurrently and resumably.
+
+Worker threads share a pool of connections, such that every running task has a
+connection of its own. Threads suffice, because the workers mostly wait for
+the database. Long extractions, like the patches of all built commits of a
+project, write their output in batches and record a checkpoint after each
+batch: an interrupted run resumes after the last complete batch. Output files
+only appear once complete.
+
+Connections are opened with `database.connect`, hence the queries also run on
+the embedded database.
+"""
+
+import contextlib
+import csv
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from testmining import database, executor, util
+
+LOG = logging.getLogger(__file__)
+
+__all__ = [
+    'ConnectionPool',
+    'workers_option',
+    'run',
+    'write_batches',
+]
+
+CHECKPOINT_EXTENSION = '.checkpoint'
+PARTIAL_EXTENSION = '.partial'
+
+
+class ConnectionPool:
+    """Lend connections to threads, opening up to `size` connections on demand."""
+
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.size = size
+        self._idle = queue.Queue()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection for the block, and end its transaction afterwards."""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._opened:
+                conn.close()
+            self._opened.clear()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and len(self._opened) < self.size:
+                conn = self.connect()
+                self._opened.append(conn)
+                return conn
+        return self._idle.get()
+
+
+def workers_option(func):
+    """Add the `--workers` option to a click command."""
+    return click.option('--workers', '-w',
+                        type=int,
+                        default=1,
+                        show_default=True,
+                        help='Number of concurrent queries, each with its own connection')(func)
+
+
+def run(func, tasks, connect=database.connect, workers=1):
+    """Call `func(conn, *args)` for every task, with a connection of its own.
+
+    :param func: the function to apply
+    :param tasks: pairs of (task name, tuple of arguments)
+    :param connect: function which opens a connection
+    :param workers: the number of threads and connections
+    :return: a list of results in the order of the tasks
+    :raise executor.TaskError: if a task fails, after the running tasks are done
+    """
+    tasks = list(tasks)
+    pool = ConnectionPool(connect, workers)
+
+    def call(name, args):
+        with pool.connection() as conn:
+            LOG.info('Starting %s', name)
+            return func(conn, *args)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            futures = [threads.submit(call, name, args) for name, args in tasks]
+            try:
+                return [_result(name, future) for (name, _), future in zip(tasks, futures)]
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        pool.close()
+
+
+def _result(name, future):
+    try:
+        return future.result()
+    except Exception as e:
+        raise executor.TaskError(name, e) from e
+
+
+def write_batches(filename, columns, items, batch_size, fetch):
+    """Write the rows which `fetch(batch)` returns for all batches of `items` as CSV.
+
+    Rows are appended to a partial file next to `filename` batch by batch, and a
+    checkpoint records how many items and bytes are done. If both exist from an
+    interrupted run over the same items, the run resumes after the last
+    checkpoint. The partial file replaces `filename` once complete.
+
+    :param items: list of strings, such as commit ids, in a stable order
+    :param fetch: function of a list of items to an iterable of rows
+    """
+    partial = filename + PARTIAL_EXTENSION
+    checkpoint = filename + CHECKPOINT_EXTENSION
+    digest = hashlib.sha1('\n'.join(items).encode('utf-8')).hexdigest()
+
+    progress = _read_checkpoint(checkpoint)
+    if progress is None or progress['items'] != digest or not os.path.exists(partial):
+        with open(partial, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(columns)
+        position = 0
+    else:
+        with open(partial, 'r+b') as f:
+            # Drop rows of a batch which was written only partly
+            f.truncate(progress['size'])
+        position = progress['position']
+        LOG.info("Resuming '%s' after %d of %d items", filename, position, len(items))
+
+    with open(partial, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for start in range(position, len(items), batch_size):
+            writer.writerows(fetch(items[start:start + batch_size]))
+            f.flush()
+            os.fsync(f.fileno())
+            _write_checkpoint(checkpoint, {
+                'items': digest,
+                'position': min(start + batch_size, len(items)),
+                'size': f.tell(),
+            })
+
+    os.replace(partial, filename)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+def _read_checkpoint(filename):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_checkpoint(filename, progress):
+    with util.atomic_output(filename) as temporary:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
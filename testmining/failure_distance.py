@@ -7,6 +7,7 @@ Failure distances describe the minimum number of builds, which a test case of
 the current build failed the last time.
 """
 
+import functools
 import logging
 import os
 import warnings
@@ -17,7 +18,7 @@ import altair as alt
 import numpy as np
 import pandas as pd
 
-from testmining import folders, util
+from testmining import cache, folders, util, executor
 from testmining.apfd import read_tests
 
 LOG = logging.getLogger(__file__)
@@ -25,17 +26,19 @@ LOG = logging.getLogger(__file__)
 # pragma pylint: disable=fixme
 
 
-def _load_builds():
-    path = folders.cache()
-    with pd.HDFStore(path) as store:
-        return store['builds']
+BUILD_COLUMNS = ['tr_build_number', 'gh_build_started_at', 'tr_duration']
 
 
-BUILDS = _load_builds()
+@functools.lru_cache(maxsize=32)
+def project_builds(project_name):
+    """Read the builds of one project from the cache, on first use only."""
+    return cache.read('builds',
+                      where={'gh_project_name': util.db_project_name(project_name)},
+                      columns=BUILD_COLUMNS)
 
 
 def build_timestamps(project_name):
-    builds = BUILDS[BUILDS['gh_project_name'] == util.db_project_name(project_name)]
+    builds = project_builds(project_name)
 
     end = builds['gh_build_started_at'] + \
         pd.to_timedelta(builds['tr_duration'], unit='s')
@@ -46,7 +49,7 @@ def build_timestamps(project_name):
     }).reset_index().set_index(builds['tr_build_number'])
 
 
-def _failure_distance(project_name, builds):
+def failure_distances(project_name, builds):
     """For every build, determine how many builds the current failures are in the past.
 
     For example:
@@ -56,62 +59,62 @@ def _failure_distance(project_name, builds):
     This allows a finer-grained characterization of "edge changelists". E.g., include
     only edge change lists whose failures are at least 10 builds apart.
 
-    Implementation note: we scan the build numbers in descending order from left-to-right.
-    Each increment in the index means one further step into the past.
+    Implementation note: we sweep the builds once in ascending order of build numbers,
+    and remember for every test the positions of the builds it failed in. Builds
+    still running when the current build began do not count as prior builds.
+    Because end timestamps are nearly ordered by build number, a watermark (the
+    latest end of all builds up to a position) tells up to which position all
+    builds qualify; only the few positions after it are checked one by one.
     """
 
-    build_numbers = builds.index.unique().sort_values(ascending=False)
-    build_ts = build_timestamps(project_name).sort_index(ascending=False)
-
-    index = 0
+    build_numbers = builds.index.unique().sort_values()
+    build_ts = build_timestamps(project_name).groupby(level=0).agg({
+        'begin': 'min',
+        'end': 'max',
+    }).loc[build_numbers]
+
+    # Major problem with TravisTorrent: some build numbers are assigned twice
+    # Example: julianhyde/optiq 626
+    # NaT is the smallest integer, hence builds without end always qualify
+    begin = build_ts['begin'].to_numpy().view('i8')
+    no_begin = np.isnat(build_ts['begin'].to_numpy())
+    end = build_ts['end'].to_numpy().view('i8')
+    watermark = np.maximum.accumulate(end)
+
+    failed = {}
     rows = []
-
-    while index < len(build_numbers):
-        build_number = build_numbers[index]
-        red_tests = set(builds.loc[build_number]['testName'])
-        prior_index = index + 1
-        distance = {}
-        begin = pd.Series(build_ts.loc[build_number]['begin']).min()  # FIXME
-
-        while prior_index < len(builds):
-
-            prior_build_number = build_numbers[prior_index]
-            prior_end = pd.Series(build_ts.loc[prior_build_number]['end']).max()  # FIXME
-            # Major problem with TravisTorrent: some build numbers are assigned twice
-            # Example: julianhyde/optiq 626
-            if prior_end > begin:
-                prior_index += 1
-                continue
-
-            for test in set(builds.loc[prior_build_number]['testName']):
-                if test in red_tests:
-                    distance[test] = prior_index - index
-                    red_tests.remove(test)
-
-            if red_tests:
-                prior_index += 1
-            else:
-                break
-
-        for test in red_tests:
-            distance[test] = np.nan
-
-        rows.append((
-            builds.loc[build_number]['travisBuildId'],
-            _min_nan(distance.values())
-        ))
-        index += 1
-
+    build_ids = builds.loc[build_numbers, 'travisBuildId'].to_numpy()
+    for position, tests in enumerate(builds.loc[build_numbers, 'testName']):
+        if no_begin[position]:
+            bound = position - 1
+        else:
+            bound = min(np.searchsorted(watermark, begin[position], side='right'), position) - 1
+
+        distances = []
+        for test in set(tests):
+            positions = failed.get(test, ())
+            index = len(positions) - 1
+            while index >= 0 and positions[index] > bound \
+                    and end[positions[index]] > begin[position]:
+                index -= 1
+            distances.append(position - positions[index] if index >= 0 else np.nan)
+
+        rows.append((build_ids[position], min_nan(distances)))
+        for test in set(tests):
+            failed.setdefault(test, []).append(position)
+
+    rows.reverse()
     return pd.DataFrame(rows, columns=['travisBuildId', 'distance'])
 
 
-def _min_nan(it):
+def min_nan(it):
     with warnings.catch_warnings():
         warnings.simplefilter('ignore', RuntimeWarning)
         return np.nanmin(list(it))
 
 
-def _failed_builds(untreated):
+def failed_builds(untreated):
+    """Group the failed executions of the untreated strategy by build number."""
     return untreated[untreated['red'] > 0].groupby('travisBuildNumber').agg({
         'travisBuildId': 'first',
         'testName': list,
@@ -143,24 +146,26 @@ def _build_apfd(project_path, untreated, strategies=None):
 
 def compute_distances(project_name, project_path, strategies):
     untreated = read_tests(folders.strategy(project_path, 'untreated'))
-    builds = _failed_builds(untreated)
+    builds = failed_builds(untreated)
     apfd = _build_apfd(project_path, untreated, strategies)
-    distances = _failure_distance(project_name, builds)
+    distances = failure_distances(project_name, builds)
     return pd.merge(left=apfd,
                     right=distances,
                     on='travisBuildId',
                     validate='m:1')
 
 
-def collect_distances(strategies):
-    dfs = []
-    for project_name, project_path in folders.projects():
-        LOG.info('Processing %s', project_name)
-        dfs.append(compute_distances(project_name, project_path, strategies))
-    return pd.concat(dfs)
+def collect_distances(strategies, jobs=1):
+    return pd.concat(executor.map_projects(_compute_project, strategies, jobs=jobs))
+
+
+def _compute_project(project_name, project_path, strategies):
+    LOG.info('Processing %s', project_name)
+    return compute_distances(project_name, project_path, strategies)
 
 
 def _handle_project(project_name, project_path, strategies):
+    LOG.info('Processing %s', project_name)
     df = compute_distances(project_name, project_path, strategies)
     chart = make_scatter_chart(df).properties(title=project_path)
     output = os.path.join(folders.evaluation(project_path), 'testi2.png')
@@ -218,25 +223,26 @@ def cli():
 
 @cli.command()
 @click.argument('strategies', nargs=-1)
-def scatter(strategies):
-    for project_name, project_path in folders.projects():
-        LOG.info('Processing %s', project_name)
-        _handle_project(project_name, project_path, strategies)
+@executor.jobs_option
+def scatter(strategies, jobs):
+    executor.map_projects(_handle_project, strategies, jobs=jobs)
 
 
 @cli.command()
 @click.option('--output', required=True)
 @click.argument('strategies', nargs=-1)
-def scatter_all(output, strategies):
-    df = collect_distances(strategies)
+@executor.jobs_option
+def scatter_all(output, strategies, jobs):
+    df = collect_distances(strategies, jobs)
     chart = make_scatter_chart(df)
     chart.save(output)
 
 
 @cli.command()
 @click.argument('strategies', nargs=-1)
-def comparison(strategies):
-    collect_distances(strategies)
+@executor.jobs_option
+def comparison(strategies, jobs):
+    collect_distances(strategies, jobs)
 
 
 def distance_bar_chart(df):
@@ -7,6 +7,12 @@ Given the database, use SQL to extract different types of jobs.
 - pull requests: this build is part of a pull request.
 
 The queries can be expensive; therefore, store a CSV for use with notebooks.
+Projects are queried concurrently, and projects whose CSV exists are skipped,
+such that an interrupted run resumes with the remaining projects.
+
+With `offenders --local`, offenders are derived from the jobs of the
+TravisTorrent dump (or its partitions) and the untreated strategy instead,
+without the database.
 """
 
 import logging
@@ -14,10 +20,10 @@ import os
 
 import click
 
+import numpy as np
 import pandas as pd
 
-from testmining.util import connection
-from testmining import folders, util
+from testmining import database, executor, extraction, folders, loader, util
 
 LOG = logging.getLogger(__file__)
 
@@ -27,28 +33,78 @@ def main():
     pass
 
 
+def remaining_projects(output, force=False):
+    """List the tasks of projects whose `output(project_path)` does not exist yet."""
+    tasks = []
+    for project_name, project_path in folders.projects():
+        if force or not os.path.exists(output(project_path)):
+            tasks.append((project_name, (project_name, project_path)))
+        else:
+            LOG.warning("Skipped %s", project_name)
+    return tasks
+
+
+def write_jobs(jobs, filename):
+    # Only complete files mark a project as done
+    with util.atomic_output(filename) as temporary:
+        jobs.to_csv(temporary, index=False)
+    LOG.info('Written %s', filename)
+
+
 @main.command('offenders')
-def offenders_main():
-    with connection() as conn:
-        for project_name, project_path in folders.projects():
-            offenders = folders.offenders(project_path)
-            if not os.path.exists(offenders):
-                handle_offenders(conn, project_name, project_path)
-            else:
-                LOG.warning("Skipped %s", project_name)
+@click.option('--local', is_flag=True,
+              help='Derive offenders from the dump and the untreated strategies, '
+                   'without the database')
+@click.option('--force', is_flag=True, help='Also replace existing CSVs')
+@extraction.workers_option
+def offenders_main(local, force, workers):
+    tasks = remaining_projects(folders.offenders, force)
+    if local:
+        executor.run(handle_local_offenders, tasks, jobs=workers)
+    else:
+        extraction.run(handle_offenders, tasks, workers=workers)
 
 
 def handle_offenders(conn, project_name, project_path):
     LOG.info('Starting offenders query for project %s', project_name)
-    jobs = query_offenders(conn, project_name)
-    filename = folders.offenders(project_path)
-    jobs.to_csv(filename, index=False)
-    LOG.info('Written %s', filename)
+    write_jobs(query_offenders(conn, project_name), folders.offenders(project_path))
+
+
+def handle_local_offenders(project_name, project_path):
+    LOG.info('Deriving offenders of project %s', project_name)
+    write_jobs(local_offenders(project_name, project_path), folders.offenders(project_path))
+
+
+def local_offenders(project_name, project_path):
+    """Derive the same jobs as `query_offenders` from the dump and the untreated strategy.
+
+    Jobs are red if a test failed or errored in the untreated strategy, and
+    green otherwise, also without test results. Offenders are red jobs, unless
+    a job of the build with the preceding build number is green.
+
+    :raise FileNotFoundError: if there is neither the dump nor its partitions
+    """
+    dump = folders.travis_torrent()
+    if not os.path.exists(dump) and not folders.fresh_partitions(dump):
+        raise FileNotFoundError("No TravisTorrent dump '%s' to derive offenders from" % dump)
+    chunks = loader.iter_jobs(dump, ['tr_job_id', 'tr_build_number'],
+                              where={'gh_project_name': util.db_project_name(project_name)})
+    jobs = loader.concat_chunks([chunk[['tr_job_id', 'tr_build_number']] for chunk in chunks])
+    if jobs.empty:
+        return pd.DataFrame({'tr_job_id': np.array([], dtype=np.int64)})
+
+    results = loader.read_strategy(folders.strategy(project_path, 'untreated'),
+                                   columns=['travisJobId', 'failures', 'errors'])
+    failed = results.loc[(results['failures'] + results['errors']) > 0, 'travisJobId'].unique()
+    red = jobs['tr_job_id'].isin(failed)
+
+    green_builds = jobs.loc[~red, 'tr_build_number'].unique()
+    offenders = jobs.loc[red & ~(jobs['tr_build_number'] - 1).isin(green_builds), 'tr_job_id']
+    return pd.DataFrame({'tr_job_id': np.sort(offenders.to_numpy())})
 
 
 def query_offenders(conn, project):
-    with conn.cursor() as c:
-        c.execute("""
+    return database.query(conn, """
         SELECT tt1.tr_job_id FROM travistorrent_8_2_2017 as tt1
         WHERE tt1.gh_project_name = %s
         AND EXISTS (
@@ -66,31 +122,21 @@ def query_offenders(conn, project):
           )
         );
         """, (util.db_project_name(project),))
-        return pd.DataFrame(c.fetchall(), columns=['tr_job_id'])
 
 
 @main.command()
-def pull_requests():
-    with connection() as conn:
-        for project_name, project_path in folders.projects():
-            pr = folders.pull_requests(project_path)
-            if not os.path.exists(pr):
-                handle_pull_requests(conn, project_name, project_path)
-            else:
-                LOG.warning("Skipped %s", project_name)
+@extraction.workers_option
+def pull_requests(workers):
+    extraction.run(handle_pull_requests, remaining_projects(folders.pull_requests), workers=workers)
 
 
 def handle_pull_requests(conn, project_name, project_path):
     LOG.info('Starting pull requests query for project %s', project_name)
-    jobs = query_pull_requests(conn, project_name)
-    filename = folders.pull_requests(project_path)
-    jobs.to_csv(filename, index=False)
-    LOG.info('Written %s', filename)
+    write_jobs(query_pull_requests(conn, project_name), folders.pull_requests(project_path))
 
 
 def query_pull_requests(conn, project):
-    with conn.cursor() as c:
-        c.execute('''
+    return database.query(conn, '''
         SELECT tt.tr_job_id FROM travistorrent_8_2_2017 tt
         WHERE tt.gh_is_pr = '1' AND tt.gh_project_name = %s
         AND EXISTS (
@@ -99,7 +145,6 @@ def query_pull_requests(conn, project):
           AND (tr.failures > 0 OR tr.errors > 0)
         )
         ''', (util.db_project_name(project),))
-        return pd.DataFrame(c.fetchall(), columns=['tr_job_id'])
 
 
 if __name__ == '__main__':
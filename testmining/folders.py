@@ -14,6 +14,14 @@ ENV_QUALIFIER = 'PRIO_QUALIFIER'
 
 STRATEGY_PATTERN = re.compile('^.*@([.\\w-]+).csv$')
 
+PERMUTATION_PATTERN = re.compile('^.*@([.\\w-]+)\\.perm\\.npy$')
+
+COLUMNAR_EXTENSION = '.feather'
+
+PERMUTATION_EXTENSION = '.perm.npy'
+
+CACHE_FOLDER = 'cache'
+
 
 def base_folder():
     return os.getenv(ENV_BASE_FOLDER) or '../output'
@@ -25,9 +33,11 @@ def qualifier():
 
 def projects():
     base = base_folder()
-    for item in os.listdir(base):
+    # Folders next to the projects, which hold the cache and the partitioned dump
+    excluded = {CACHE_FOLDER, os.path.basename(partitions(travis_torrent()))}
+    for item in sorted(os.listdir(base)):
         path = os.path.join(base, item)
-        if os.path.isdir(path):
+        if os.path.isdir(path) and item not in excluded:
             yield item, path
 
 
@@ -36,8 +46,16 @@ def project(project_name):
 
 
 def strategies(project_path):
+    """List pairs of (strategy name, CSV filename) of a project.
+
+    Strategies only kept in the permutation store are listed with the name
+    of their former CSV file, which the readers resolve to the store.
+    """
     folder = os.path.join(project_path, qualifier())
-    return find_files(folder, STRATEGY_PATTERN)
+    found = dict(find_files(folder, STRATEGY_PATTERN))
+    for name, path in find_files(folder, PERMUTATION_PATTERN):
+        found.setdefault(name, os.path.splitext(os.path.splitext(path)[0])[0] + '.csv')
+    return sorted(found.items())
 
 
 def strategy(project_path, strategy_name):
@@ -46,6 +64,54 @@ def strategy(project_path, strategy_name):
     return os.path.join(project_path, qualifier(), filename)
 
 
+def columnar(filename):
+    """Name the columnar sibling of a CSV file, e.g., 'jade4j@lru.feather'."""
+    return os.path.splitext(filename)[0] + COLUMNAR_EXTENSION
+
+
+def fresh_columnar(filename):
+    """Get the columnar sibling of a CSV file if it is at least as new as the CSV.
+
+    :param filename: the CSV file
+    :return: the path of the columnar file, or None if absent or outdated
+    """
+    path = columnar(filename)
+    return path if _is_fresh(path, filename) else None
+
+
+def executions(filename):
+    """Name the canonical execution table shared by all strategies of a project.
+
+    :param filename: the CSV file of any strategy of the project
+    """
+    folder, name = os.path.split(filename)
+    repository = name.split('@', maxsplit=1)[0]
+    return os.path.join(folder, '%s.executions%s' % (repository, COLUMNAR_EXTENSION))
+
+
+def permutation(filename):
+    """Name the permutation of a strategy CSV, e.g., 'jade4j@lru.perm.npy'."""
+    return os.path.splitext(filename)[0] + PERMUTATION_EXTENSION
+
+
+def fresh_permutation(filename):
+    """Get the permutation of a strategy CSV if it and the execution table are up to date.
+
+    :param filename: the CSV file, which may have been removed
+    :return: the path of the permutation, or None if absent or outdated
+    """
+    path = permutation(filename)
+    if _is_fresh(path, filename) and _is_fresh(path, executions(filename)) \
+            and os.path.exists(executions(filename)):
+        return path
+    return None
+
+
+def origin(filename):
+    """Get the file which a strategy was read from: the CSV, or else its permutation."""
+    return filename if os.path.exists(filename) else permutation(filename)
+
+
 def evaluation(project_path):
     path = os.path.join(project_path, '%s-evaluation' % qualifier())
     return _ensure_exists(path)
@@ -56,6 +122,11 @@ def apfd(project_path):
     return os.path.join(evaluation(project_path), '%s-apfd.csv' % project_name)
 
 
+def apfd_manifest(project_path):
+    project_name = _name(project_path)
+    return os.path.join(evaluation(project_path), '%s-apfd-manifest.json' % project_name)
+
+
 def offenders(project_path):
     project_name = _name(project_path)
     return os.path.join(project_path, '%s-offenders.csv' % project_name)
@@ -71,19 +142,62 @@ def patches(project_path):
     return os.path.join(project_path, '%s-patches.csv' % project_name)
 
 
+def failure_history(project_path):
+    """Name the failure history index of a project, see `testmining.history`."""
+    project_name = _name(project_path)
+    return os.path.join(project_path, '%s-%s-failures.npz' % (project_name, qualifier()))
+
+
+def fresh_failure_history(project_path):
+    """Get the failure history index if it is at least as new as the untreated strategy."""
+    path = failure_history(project_path)
+    return path if _is_fresh(path, origin(strategy(project_path, 'untreated'))) else None
+
+
 def cache():
     return os.path.join(base_folder(), 'cache.hd5')
 
 
+def cache_folder():
+    """Name the folder of the cache, which is only created once something is cached."""
+    return os.path.join(base_folder(), CACHE_FOLDER)
+
+
+def cache_index():
+    return os.path.join(cache_folder(), 'index.json')
+
+
 def travis_torrent():
     return os.path.join(base_folder(), 'travistorrent_8_2_2017.csv')
 
 
+def database():
+    """Embedded copy of the database, see `testmining.database`."""
+    return os.path.join(base_folder(), 'travistorrent.sqlite')
+
+
+def partitions(filename):
+    """Name the folder of the dump partitioned by project, e.g., 'travistorrent.parquet'."""
+    return os.path.splitext(filename)[0] + '.parquet'
+
+
+def fresh_partitions(filename):
+    """Get the partitioned dump if it is at least as new as the CSV, else None."""
+    path = partitions(filename)
+    return path if _is_fresh(path, filename) else None
+
+
 def _ensure_exists(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
+    # Concurrent workers may create the same folder
+    os.makedirs(path, exist_ok=True)
     return path
 
 
+def _is_fresh(derived, source):
+    if not os.path.exists(derived):
+        return False
+    return not os.path.exists(source) or os.path.getmtime(derived) >= os.path.getmtime(source)
+
+
 def _name(project_path):
     return os.path.split(project_path)[1]
@@ -0,0 +1,206 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Build the failure history index of every project.
+
+The index lists, for each test, the builds it failed in, along with the first
+failing job and the start of the build. It is derived from the untreated
+strategy once, stored next to the project, and answers vectorized queries like
+"when did these tests fail last before build X?".
+"""
+
+import logging
+
+import click
+
+import numpy as np
+import pandas as pd
+
+from testmining import cache, executor, folders, loader, util
+
+LOG = logging.getLogger(__file__)
+
+# Returned by queries for tests which did not fail before
+NO_FAILURE = -1
+
+COLUMNS = ['travisBuildNumber', 'travisBuildId', 'travisJobId', 'testName', 'failures', 'errors']
+
+
+class FailureHistory:
+    """Failing builds per test, as sorted arrays.
+
+    Records are sorted by test, then by build, and there is one record per test
+    and failed build. The records of test `k` are `offsets[k]:offsets[k + 1]`.
+    Builds are referred to by their position in `builds`, which lists the
+    build numbers of the untreated strategy in ascending order. Only builds
+    with red jobs appear in strategy files, hence green builds have no
+    position: streaks and windows count builds with red jobs, and a streak
+    continues across green builds in between.
+    """
+
+    def __init__(self, tests, builds, offsets, position, job_id, build_id, timestamp):
+        # pylint: disable=too-many-arguments
+        self.tests = tests
+        self.builds = builds
+        self.offsets = offsets
+        self.position = position
+        self.job_id = job_id
+        self.build_id = build_id
+        self.timestamp = timestamp
+
+        self.test_index = pd.Index(tests)
+        codes = np.repeat(np.arange(len(tests)), np.diff(offsets))
+        self._keys = self._key(codes, position)
+
+        # Length of the streak of consecutive failed builds up to each record
+        starts = np.ones(len(position), dtype=bool)
+        starts[1:] = (codes[1:] != codes[:-1]) | (position[1:] != position[:-1] + 1)
+        first = np.maximum.accumulate(np.where(starts, np.arange(len(position)), 0))
+        self.streak = np.arange(len(position)) - first + 1
+
+    @property
+    def build_number(self):
+        return self.builds[self.position]
+
+    def failures(self, test):
+        """List the failed builds of a single test as DataFrame."""
+        code = self.test_index.get_loc(test)
+        records = slice(self.offsets[code], self.offsets[code + 1])
+        return pd.DataFrame({
+            'travisBuildNumber': self.builds[self.position[records]],
+            'travisBuildId': self.build_id[records],
+            'travisJobId': self.job_id[records],
+            'timestamp': self.timestamp[records],
+        })
+
+    def previous(self, tests, build_numbers):
+        """Locate the last failure of every test before the respective build.
+
+        :param tests: array of test names
+        :param build_numbers: array of build numbers, of the same length
+        :return: array of record positions, NO_FAILURE if the test did not fail before
+        """
+        codes, positions = self._query(tests, build_numbers)
+        keys = self._key(codes, positions)
+        found = np.searchsorted(self._keys, keys, side='left') - 1
+        valid = (codes >= 0) & (found >= 0) & (found >= self.offsets[np.maximum(codes, 0)])
+        return np.where(valid, found, NO_FAILURE)
+
+    def previous_failure(self, tests, build_numbers):
+        """Get the build number of the last failure before the respective build, or NO_FAILURE."""
+        found = self.previous(tests, build_numbers)
+        return np.where(found >= 0, self.builds[self.position[found]], NO_FAILURE)
+
+    def streaks(self, tests, build_numbers):
+        """Count in how many builds right before the respective build each test failed in a row."""
+        _, positions = self._query(tests, build_numbers)
+        found = self.previous(tests, build_numbers)
+        adjacent = (found >= 0) & (self.position[found] == positions - 1)
+        return np.where(adjacent, self.streak[found], 0)
+
+    def counts(self, tests, build_numbers, window):
+        """Count in how many of the `window` builds before the respective build each test failed."""
+        codes, positions = self._query(tests, build_numbers)
+        upper = np.searchsorted(self._keys, self._key(codes, positions), side='left')
+        lower = np.searchsorted(self._keys, self._key(codes, np.maximum(positions - window, 0)),
+                                side='left')
+        return np.where(codes >= 0, upper - lower, 0)
+
+    def _query(self, tests, build_numbers):
+        codes = self.test_index.get_indexer(np.asarray(tests))
+        # Builds without failing jobs are not listed: these come after the preceding build
+        positions = np.searchsorted(self.builds, np.asarray(build_numbers), side='left')
+        return codes, positions
+
+    def _key(self, codes, positions):
+        return np.asarray(codes, dtype=np.int64) * (len(self.builds) + 1) + positions
+
+    def save(self, filename):
+        with util.atomic_output(filename) as temporary:
+            with open(temporary, 'wb') as f:
+                np.savez(f,
+                         tests=self.tests,
+                         builds=self.builds,
+                         offsets=self.offsets,
+                         position=self.position,
+                         job_id=self.job_id,
+                         build_id=self.build_id,
+                         timestamp=self.timestamp)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+
+def from_strategy(filename, timestamps=None):
+    """Derive the failure history from a strategy file, usually the untreated one.
+
+    :param filename: the strategy CSV
+    :param timestamps: Series of build start by `travisBuildId`, e.g., from the builds cache
+    """
+    executions = loader.read_strategy(filename, columns=COLUMNS)
+    builds = np.unique(executions['travisBuildNumber'].to_numpy())
+
+    failed = executions[(executions['failures'] + executions['errors']) > 0]
+    codes, tests = pd.factorize(failed['testName'].astype(str), sort=True)
+    failed = pd.DataFrame({
+        'code': codes,
+        'position': np.searchsorted(builds, failed['travisBuildNumber'].to_numpy()),
+        'travisJobId': failed['travisJobId'].to_numpy(),
+        'travisBuildId': failed['travisBuildId'].to_numpy(),
+    }).sort_values(['code', 'position', 'travisJobId']).drop_duplicates(['code', 'position'])
+
+    if timestamps is None:
+        timestamp = np.full(len(failed), np.datetime64('NaT'), dtype='datetime64[ns]')
+    else:
+        timestamp = timestamps.reindex(failed['travisBuildId']).to_numpy(dtype='datetime64[ns]')
+
+    return FailureHistory(tests=np.asarray(tests, dtype=str),
+                          builds=builds,
+                          offsets=np.searchsorted(failed['code'].to_numpy(),
+                                                  np.arange(len(tests) + 1)),
+                          position=failed['position'].to_numpy(),
+                          job_id=failed['travisJobId'].to_numpy(),
+                          build_id=failed['travisBuildId'].to_numpy(),
+                          timestamp=timestamp)
+
+
+def build_timestamps(project_name):
+    """Start of every build of a project by build id, or None without the builds cache."""
+    try:
+        builds = cache.read('builds',
+                            where={'gh_project_name': util.db_project_name(project_name)},
+                            columns=['gh_build_started_at'])
+    except KeyError:
+        LOG.warning('No builds cache, failure history of %s lacks timestamps', project_name)
+        return None
+    return builds['gh_build_started_at']
+
+
+def write_project(project_name, project_path, force=False):
+    if not force and folders.fresh_failure_history(project_path):
+        LOG.info('Failure history of %s is up to date', project_name)
+        return
+    history = from_strategy(folders.strategy(project_path, 'untreated'),
+                            build_timestamps(project_name))
+    history.save(folders.failure_history(project_path))
+    LOG.info('Written failure history of %s (%d tests)', project_name, len(history.tests))
+
+
+def load(project_name, project_path):
+    """Load the failure history of a project, and build it first if missing or outdated."""
+    write_project(project_name, project_path)
+    return FailureHistory.load(folders.failure_history(project_path))
+
+
+@click.command(help=__doc__)
+@click.option('--force', is_flag=True, help='Also rebuild up-to-date indexes')
+@executor.jobs_option
+def main(force, jobs):
+    logging.basicConfig(level=logging.INFO)
+    executor.map_projects(write_project, force, jobs=jobs)
+
+
+if __name__ == '__main__':
+    main()
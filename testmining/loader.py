@@ -1,13 +1,26 @@
 # -*- encoding: utf-8 -*-
 
 """
-Load the TravisTorrent CSV, and coerce datatypes for certain columns.
+Load the TravisTorrent CSV and the strategy CSVs, and coerce datatypes for
+certain columns.
 """
 
 import logging
+import os
+import shutil
+import urllib.parse
 
+import numpy as np
 import pandas as pd
 
+from pandas.api.types import union_categoricals
+
+import pyarrow as pa
+
+from pyarrow import dataset, feather, parquet
+
+from testmining import cache, folders, util
+
 
 MergeMethod = pd.Categorical(values=['merge_button',
                                      'commits_in_master',
@@ -31,6 +44,65 @@ PARSERS = {
     'git_all_built_commits': lambda value: value.split('#'),
 }
 
+# Compact schema of the dump for `read_jobs`: repetitive strings are interned
+# as categories, and boolean fields keep their NAs without becoming floats.
+CATEGORICAL_FIELDS = [
+    'gh_project_name',
+    'gh_lang',
+    'git_branch',
+]
+
+BOOLEAN_FIELDS = [
+    'gh_is_pr',
+    'gh_by_core_team_member',
+    'tr_log_bool_tests_ran',
+    'tr_log_bool_tests_failed',
+]
+
+COMPACT_DTYPES = dict(DTYPES,
+                      **{field: 'category' for field in CATEGORICAL_FIELDS},
+                      **{field: 'boolean' for field in BOOLEAN_FIELDS})
+
+COMMITS_FIELD = 'git_all_built_commits'
+
+# Columns of the dump by type, see `dump_schema`; all other columns are
+# numbers, which are read as floats because of NAs
+TEXT_FIELDS = [
+    'gh_project_name',
+    'gh_lang',
+    'git_merged_with',
+    'git_branch',
+    'gh_commits_in_push',
+    'git_prev_commit_resolution_status',
+    'git_prev_built_commit',
+    'git_all_built_commits',
+    'git_trigger_commit',
+    'tr_virtual_merged_into',
+    'tr_original_commit',
+    'tr_status',
+    'tr_jobs',
+    'tr_log_lan',
+    'tr_log_status',
+    'tr_log_analyzer',
+    'tr_log_frameworks',
+    'tr_log_tests_failed',
+]
+
+ID_FIELDS = [
+    'tr_build_id',
+    'tr_build_number',
+    'tr_job_id',
+]
+
+# Parsing the dump for `write_partitions`: each chunk gets the same types
+PARTITION_DTYPES = dict(**{field: object for field in TEXT_FIELDS},
+                        **{field: 'boolean' for field in BOOLEAN_FIELDS},
+                        **{field: np.int64 for field in ID_FIELDS})
+
+PARTITIONING = dataset.partitioning(pa.schema([('gh_project_name', pa.string())]), flavor='hive')
+
+DUMP_CHUNKSIZE = 1 << 18
+
 LOG = logging.getLogger(__name__)
 
 
@@ -41,5 +113,321 @@ def read_dump(filename):
                        dtype=DTYPES,
                        parse_dates=DATE_FIELDS,
                        converters=PARSERS)
+    # Identifies the dump for memoization, see `cache.memoize`
+    cache.identify(jobs, filename)
     LOG.info("Completed reading '%s'", filename)
     return jobs
+
+
+def read_jobs(filename, columns=None, chunksize=DUMP_CHUNKSIZE, with_commits=False, where=None):
+    """Read the dump chunk by chunk, with a compact schema and only some columns.
+
+    Unlike `read_dump`, the built commits are not parsed into lists per job.
+    Instead, they are either kept as '#'-separated string or, `with_commits`,
+    split into a separate table with one row per job and commit (see
+    `split_commits`) while reading.
+
+    If an up-to-date partitioned copy of the dump exists (see
+    `write_partitions`), only the files of the selected projects and the
+    requested columns are read from it, instead of parsing the CSV.
+
+    :param filename: the TravisTorrent CSV
+    :param columns: the columns to read, all if None
+    :param chunksize: rows parsed at once, which bounds the transient memory
+    :param with_commits: if True, return a pair of (jobs, commits)
+    :param where: dict of column to a value or a list of values, e.g., to
+                  select projects by 'gh_project_name'
+    """
+    usecols = None
+    if columns is not None:
+        usecols = list(columns)
+        extra = ['tr_build_id', 'tr_job_id', COMMITS_FIELD] if with_commits else []
+        usecols += [field for field in extra if field not in usecols]
+
+    jobs, commits = [], []
+    for chunk in iter_jobs(filename, usecols, chunksize, where):
+        if with_commits:
+            commits.append(split_commits(chunk))
+        jobs.append(chunk[[column for column in (columns or chunk.columns)
+                           if not (with_commits and column == COMMITS_FIELD)]])
+    LOG.info("Completed reading '%s'", filename)
+
+    # Identifies the dump and query for memoization, see `cache.memoize`
+    query = '%s:%s' % (','.join(columns or []), sorted((where or {}).items()))
+    jobs = cache.identify(concat_chunks(jobs), filename, query)
+    if not with_commits:
+        return jobs
+    return jobs, cache.identify(concat_chunks(commits), filename, query + ':commits')
+
+
+def iter_jobs(filename, columns=None, chunksize=DUMP_CHUNKSIZE, where=None, since=None, offset=0):
+    """Iterate the jobs of the dump in chunks, with the compact schema of `read_jobs`.
+
+    Chunks hold the given columns in the order of the dump, and the built
+    commits as '#'-separated strings. From the partitioned dump, the selected
+    rows are read at once.
+
+    :param since: if given, only jobs with a larger 'tr_job_id'
+    :param offset: position in the CSV to start parsing at, which has to be
+                   the start of a line; the partitioned dump is read entirely
+    """
+    if columns is not None:
+        extra = list(where or []) + (['tr_job_id'] if since is not None else [])
+        columns = list(columns) + [field for field in extra if field not in columns]
+    partitions = folders.fresh_partitions(filename)
+    if partitions:
+        return iter([_read_partitions(partitions, columns, where, since)])
+    return _read_csv_chunks(filename, columns, chunksize, where, since, offset)
+
+
+def partitioned_projects(filename):
+    """List the projects of the partitioned dump, or None if it is absent or outdated."""
+    partitions = folders.fresh_partitions(filename)
+    if not partitions:
+        return None
+    prefix = 'gh_project_name='
+    return sorted(urllib.parse.unquote(item[len(prefix):]) for item in os.listdir(partitions)
+                  if item.startswith(prefix))
+
+
+def _read_csv_chunks(filename, usecols, chunksize, where, since, offset):
+    LOG.info("Begin reading '%s' in chunks of %d rows", filename, chunksize)
+    if offset >= os.path.getsize(filename):
+        return
+    with open(filename, 'rb') as f:
+        names = None
+        if offset:
+            # Parse the header only, then continue with the rows at the offset
+            names = pd.read_csv(f, nrows=0).columns
+            f.seek(offset)
+        reader = pd.read_csv(f,
+                             engine='c',
+                             names=names,
+                             header=None if offset else 'infer',
+                             usecols=usecols,
+                             dtype=COMPACT_DTYPES,
+                             parse_dates=[field for field in DATE_FIELDS
+                                          if usecols is None or field in usecols],
+                             chunksize=chunksize)
+        for chunk in reader:
+            if since is not None:
+                chunk = chunk[chunk['tr_job_id'] > since]
+            yield util.select(chunk, where)
+
+
+def _read_partitions(path, usecols, where, since):
+    LOG.info("Begin reading '%s'", path)
+    filters = util.filters(where)
+    if since is not None:
+        filters = (filters or []) + [('tr_job_id', '>', since)]
+    table = parquet.read_table(path, columns=usecols, filters=filters, partitioning='hive')
+    df = table.to_pandas()
+    return df.astype({column: dtype for column, dtype in COMPACT_DTYPES.items() if column in df})
+
+
+def dump_schema(columns):
+    """Arrow schema of the given columns of the dump, independent of the values of a chunk."""
+    def arrow_type(column):
+        if column in DATE_FIELDS:
+            return pa.timestamp('ns')
+        if column in BOOLEAN_FIELDS:
+            return pa.bool_()
+        if column in TEXT_FIELDS:
+            return pa.string()
+        if column in ID_FIELDS:
+            return pa.int64()
+        return pa.float64()
+    return pa.schema([(column, arrow_type(column)) for column in columns])
+
+
+def write_partitions(filename, chunksize=DUMP_CHUNKSIZE):
+    """Convert the dump into Parquet files partitioned by project, in a single pass.
+
+    Every chunk of the CSV adds one file to the folder of each project it
+    contains. The folder replaces an existing one once complete.
+    """
+    target = folders.partitions(filename)
+    temporary = '%s.%d.tmp' % (target, os.getpid())
+    shutil.rmtree(temporary, ignore_errors=True)
+    LOG.info("Begin partitioning '%s' into '%s'", filename, target)
+    reader = pd.read_csv(filename,
+                         engine='c',
+                         dtype=PARTITION_DTYPES,
+                         parse_dates=DATE_FIELDS,
+                         chunksize=chunksize)
+    try:
+        schema = None
+        for number, chunk in enumerate(reader):
+            schema = schema or dump_schema(chunk.columns)
+            dataset.write_dataset(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                                  temporary,
+                                  format='parquet',
+                                  partitioning=PARTITIONING,
+                                  basename_template='part-%06d-{i}.parquet' % number,
+                                  existing_data_behavior='overwrite_or_ignore')
+            LOG.info("Partitioned %d rows", (number + 1) * chunksize)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temporary, target)
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+    LOG.info("Completed partitioning '%s'", filename)
+
+
+def split_commits(jobs):
+    """Explode the built commits of jobs into one row per job and commit.
+
+    Commits are either '#'-separated, as in the CSV, or lists as parsed by
+    `read_dump`. They keep the order within the job, such that the
+    concatenated commits of all jobs equal the lists of `read_dump`. Jobs
+    without commits, i.e., a missing list, have no rows.
+    """
+    built = jobs[COMMITS_FIELD]
+    if not pd.api.types.is_float_dtype(built):
+        # Any row may be missing, hence split every string, and keep lists as they are
+        split = built.astype(object).str.split('#')
+        built = split.where(split.notna(), built)
+    exploded = built.explode().dropna()
+    return pd.DataFrame({
+        'tr_build_id': jobs['tr_build_id'].reindex(exploded.index).to_numpy(),
+        'tr_job_id': jobs['tr_job_id'].reindex(exploded.index).to_numpy(),
+        'git_commit': exploded.to_numpy(),
+    }).astype({'git_commit': 'category'})
+
+
+def concat_chunks(chunks):
+    """Concatenate frames, unifying the categories which every chunk inferred on its own."""
+    if not chunks:
+        return pd.DataFrame()
+    categorical = [column for column, dtype in chunks[0].dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype)
+                   and any(chunk[column].dtype != dtype for chunk in chunks)]
+    unified = {column: union_categoricals([chunk[column] for chunk in chunks], sort_categories=True)
+               for column in categorical}
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for column, values in unified.items():
+        df[column] = values
+    return df[chunks[0].columns]
+
+
+# Compact schema of the strategy CSVs: test names are interned as categories,
+# which store one int code per row. Counters use int32, because int16 silently
+# wraps around on overflow when parsing.
+STRATEGY_DTYPES = {
+    'travisBuildNumber': np.int32,
+    'travisBuildId': np.int32,
+    'travisJobId': np.int32,
+    'testName': 'category',
+    'index': np.int32,
+    'duration': np.float32,
+    'count': np.int32,
+    'failures': np.int32,
+    'errors': np.int32,
+    'skipped': np.int32,
+}
+
+
+def read_strategy(filename, columns=None, chunksize=None, columnar=True):
+    """Read test executions of a strategy CSV with a compact schema.
+
+    If an up-to-date columnar copy of the CSV exists (see `write_columnar`), it
+    is memory-mapped instead of parsing the CSV. Likewise, if the strategy is
+    kept in the permutation store (see `testmining.permutation`), its rows are
+    gathered from the memory-mapped execution table of the project.
+
+    :param filename: the strategy CSV
+    :param columns: the columns to parse, in this order; all columns if None
+    :param chunksize: if given, return an iterator of frames with this many rows
+    :param columnar: whether to use columnar copies and the permutation store;
+                     if False, the CSV itself is parsed
+    :return: a DataFrame, or an iterator of DataFrames
+    """
+    if columnar:
+        permutation = folders.fresh_permutation(filename)
+        if permutation:
+            return _read_permuted(filename, permutation, columns, chunksize)
+        copy = folders.fresh_columnar(filename)
+        if copy:
+            return _read_columnar(copy, columns, chunksize)
+    return _read_csv(filename, columns, chunksize)
+
+
+def _read_csv(filename, columns, chunksize):
+    LOG.debug("Reading '%s'", filename)
+    dtypes = STRATEGY_DTYPES if columns is None else \
+        {column: STRATEGY_DTYPES[column] for column in columns}
+    tests = pd.read_csv(filename,
+                        engine='c',
+                        dtype=dtypes,
+                        usecols=columns,
+                        chunksize=chunksize)
+    if columns is None or chunksize:
+        return tests
+    return tests[columns]
+
+
+def _read_columnar(filename, columns, chunksize):
+    LOG.debug("Reading '%s'", filename)
+    table = feather.read_table(filename, columns=columns, memory_map=True)
+    if chunksize:
+        return _columnar_chunks(table, chunksize)
+    return table.to_pandas()
+
+
+def _columnar_chunks(table, chunksize):
+    for offset in range(0, table.num_rows, chunksize):
+        chunk = table.slice(offset, chunksize).to_pandas()
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        yield chunk
+
+
+def _read_permuted(filename, permutation, columns, chunksize):
+    LOG.debug("Reading '%s'", permutation)
+    columns = columns or list(STRATEGY_DTYPES)
+    rows = np.load(permutation, mmap_mode='r')
+    table = feather.read_table(folders.executions(filename), memory_map=True)
+
+    index = None
+    if 'index' in columns:
+        jobs = table.column('travisJobId').to_numpy()[rows]
+        index = job_positions(jobs)
+
+    table = table.select([column for column in columns if column != 'index'])
+
+    def gather(offset, length):
+        chunk = table.take(pa.array(rows[offset:offset + length])).to_pandas()
+        if index is not None:
+            chunk['index'] = index[offset:offset + length]
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        return chunk[columns]
+
+    if chunksize:
+        return (gather(offset, chunksize) for offset in range(0, len(rows), chunksize))
+    return gather(0, len(rows))
+
+
+def job_positions(jobs):
+    """Number the rows of every job 0, 1, 2, ... given adjacent rows per job."""
+    starts = np.flatnonzero(np.concatenate(([True], jobs[1:] != jobs[:-1])))
+    lengths = np.diff(np.append(starts, len(jobs)))
+    return (np.arange(len(jobs)) - np.repeat(starts, lengths)).astype(np.int32)
+
+
+def write_columnar(filename, force=False):
+    """Store a strategy CSV as uncompressed Feather file next to it.
+
+    Uncompressed Arrow files can be memory-mapped, such that reading a subset
+    of columns only touches the bytes of these columns.
+
+    :param filename: the strategy CSV
+    :param force: also convert if the columnar file is up to date
+    :return: the name of the columnar file
+    """
+    output = folders.columnar(filename)
+    if not force and folders.fresh_columnar(filename):
+        LOG.info("Skipped up-to-date '%s'", output)
+        return output
+    tests = _read_csv(filename, None, None)
+    LOG.info("Begin writing '%s'", output)
+    tests.to_feather(output, compression='uncompressed')
+    LOG.info("Completed writing '%s'", output)
+    return output
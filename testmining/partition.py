@@ -0,0 +1,27 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Convert the TravisTorrent CSV into Parquet files partitioned by project.
+
+`loader.read_jobs` picks up the partitioned copy transparently, as long as it
+is newer than the CSV, and then reads only the projects and columns requested.
+"""
+
+import logging
+
+import click
+
+from testmining import loader
+
+
+@click.command(help=__doc__)
+@click.option('-f', '--filename', help='Location of TravisTorrent CSV', required=True)
+@click.option('--chunksize', default=loader.DUMP_CHUNKSIZE, show_default=True,
+              help='Rows parsed at once')
+def main(filename, chunksize):
+    loader.write_partitions(filename, chunksize)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -11,6 +11,14 @@ Postgres employs a heuristic such as "if query selectivity is below n percent,
 sequential scanning is cheaper than using a index". Give raw patches, this
 is hindering: the table is quite big, sequential scanning takes several days,
 and the index (commit checksums in a tree) already reaches 1 TB in size.
+
+To save round trips, each query looks up a batch of commits with
+`"sha" = ANY(...)`, which Postgres still answers with index lookups. Rows are
+streamed from a server-side cursor into the CSV, FETCH_SIZE rows at a time,
+hence neither large batches nor commits with many files exhaust the memory.
+
+Projects are extracted concurrently, and an interrupted extraction resumes
+after the last complete batch of commits (see `testmining.extraction`).
 """
 
 import logging
@@ -22,51 +30,96 @@ import click
 import pandas as pd
 
 from tqdm import tqdm
-from testmining.util import connection
+from testmining import database, extraction
 
 LOG = logging.getLogger(__file__)
 
+COLUMNS = ['sha', 'name']
+
+# Commits looked up per query
+BATCH_SIZE = 1000
+
+# Rows transferred per round trip from the server-side cursor
+FETCH_SIZE = 10000
+
 
 def commits(conn, project):
-    with conn.cursor() as c:
-        c.execute("""
+    """List the distinct commits built for a project, sorted."""
+    with database.cursor(conn) as c:
+        c.execute(database.sql(conn, """
         SELECT DISTINCT commits.sha
         FROM tr_all_built_commits commits, travistorrent_8_2_2017 tt
         WHERE commits.tr_job_id = tt.tr_job_id
         AND tt.gh_project_name = %s
-        """, (project,))
+        """), (project,))
 
-        return [row[0] for row in c.fetchall()]
+        # A stable order of commits allows to resume an extraction
+        return sorted(row[0] for row in c.fetchall())
 
 
-def patches(conn, commit_ids):
-    results = []
-    with conn.cursor() as c:
-        for commit in tqdm(commit_ids):
-            c.execute(
-                'SELECT "sha", "name" FROM "raw_patches" WHERE "sha" = %s',
-                (commit,))
-            results.append(pd.DataFrame(c.fetchall(), columns=['sha', 'name']))
+def query_patches(conn, commit_ids):
+    """Iterate the (sha, name) rows of the patches of a batch of commits."""
+    if not database.is_sqlite(conn):
+        return _stream_patches(conn, commit_ids)
+    condition = '"sha" IN (%s)' % ', '.join(['?'] * len(commit_ids))
+    with database.cursor(conn) as c:
+        c.execute('SELECT "sha", "name" FROM "raw_patches" WHERE ' + condition, list(commit_ids))
+        return c.fetchall()
 
-    return pd.concat(results).reset_index(drop=True)
 
+def _stream_patches(conn, commit_ids):
+    # A named cursor keeps the result on the server, and fetches FETCH_SIZE rows at a time
+    c = conn.cursor(name='patches')
+    c.itersize = FETCH_SIZE
+    try:
+        c.execute('SELECT "sha", "name" FROM "raw_patches" WHERE "sha" = ANY(%s)',
+                  (list(commit_ids),))
+        yield from c
+    finally:
+        c.close()
 
-def write_patches(conn, project, output):
-    commit_ids = commits(conn, project)
-    patch = patches(conn, commit_ids)
+
+def iter_patches(conn, commit_ids, batch_size=BATCH_SIZE):
+    """Yield the (sha, name) rows of the patches of the given commits.
+
+    :param batch_size: commits looked up per query
+    """
+    commit_ids = list(commit_ids)
+    for start in tqdm(range(0, len(commit_ids), batch_size), unit='batch'):
+        yield from query_patches(conn, commit_ids[start:start + batch_size])
+
+
+def patches(conn, commit_ids, batch_size=BATCH_SIZE):
+    return pd.DataFrame(list(iter_patches(conn, commit_ids, batch_size)), columns=COLUMNS)
+
+
+def patches_file(output, project):
     safe_project_name = project.replace('/', '@')
-    filename = os.path.join(output, '%s-patches.csv' % safe_project_name)
-    patch.to_csv(filename, index=False)
+    return os.path.join(output, '%s-patches.csv' % safe_project_name)
+
+
+def write_patches(conn, project, output, batch_size=BATCH_SIZE):
+    commit_ids = commits(conn, project)
+    filename = patches_file(output, project)
+    extraction.write_batches(filename, COLUMNS, commit_ids, batch_size,
+                             lambda batch: query_patches(conn, batch))
     LOG.info('Written %s', filename)
 
 
 @click.command(help=__doc__)
 @click.option("--output")
-def main(output):
-    with connection() as conn:
-        for line in sys.stdin:
-            project = line.strip()
-            write_patches(conn, project, output)
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+              help='Commits looked up per query')
+@extraction.workers_option
+def main(output, batch_size, workers):
+    tasks = []
+    for line in sys.stdin:
+        project = line.strip()
+        if os.path.exists(patches_file(output, project)):
+            LOG.warning("Skipped %s", project)
+        else:
+            tasks.append((project, (project, output, batch_size)))
+    extraction.run(write_patches, tasks, workers=workers)
 
 
 if __name__ == '__main__':
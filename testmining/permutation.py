@@ -0,0 +1,174 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Store the strategy files of a project as permutations of one execution table.
+
+All strategy CSVs of a project contain the same test executions; the strategies
+only reorder the executions within each job. The store keeps one canonical
+execution table per project (derived from the untreated strategy), and one
+int32 array of canonical row numbers per strategy. The column `index` is not
+stored, because it enumerates the rows of each job.
+
+Readers of strategy files (`loader.read_strategy`) transparently reconstruct
+the ordering from the store, which also applies to APFD computation. With
+`--remove-csv`, the CSVs are deleted once their reconstruction is verified.
+"""
+
+import logging
+import os
+
+import click
+
+import numpy as np
+import pandas as pd
+
+from testmining import folders, loader, executor, util
+
+LOG = logging.getLogger(__file__)
+
+# Columns which identify an execution; rows equal in all columns are interchangeable
+KEY = [
+    'travisJobId',
+    'testName',
+    'travisBuildNumber',
+    'travisBuildId',
+    'duration',
+    'count',
+    'failures',
+    'errors',
+    'skipped',
+]
+
+
+def encode_project(project_name, project_path, remove_csv=False):
+    """Add new or changed strategies of a project to the store.
+
+    The execution table is (re-)built from the untreated strategy if absent or
+    outdated, in which case all strategies are encoded anew. Strategies whose
+    CSV was removed are decoded from the former table beforehand.
+
+    :raise ValueError: if a strategy whose CSV was removed cannot be carried
+        over to the new table
+    """
+    untreated = folders.strategy(project_path, 'untreated')
+    table = folders.executions(untreated)
+    rebuild = not os.path.exists(table) or \
+        (os.path.exists(untreated) and os.path.getmtime(untreated) > os.path.getmtime(table))
+
+    stored = {}
+    if rebuild:
+        LOG.info('Building execution table of %s', project_name)
+        canonical = loader.read_strategy(untreated).drop(columns='index')
+        canonical_order = _order(canonical, canonical['testName'].cat.codes.values)
+        stored = _reencode_stored(project_path, canonical, canonical_order)
+        with util.atomic_output(table) as temporary:
+            canonical.to_feather(temporary, compression='uncompressed')
+    else:
+        canonical = pd.read_feather(table)
+        canonical_order = _order(canonical, canonical['testName'].cat.codes.values)
+
+    for name, path in folders.strategies(project_path):
+        if path in stored:
+            rows = stored[path]
+        elif not rebuild and folders.fresh_permutation(path):
+            continue
+        else:
+            LOG.info('Encoding %s %s', project_name, name)
+            rows = encode(canonical, loader.read_strategy(path), canonical_order)
+        with util.atomic_output(folders.permutation(path)) as temporary:
+            with open(temporary, 'wb') as f:
+                np.save(f, rows)
+
+    if remove_csv:
+        for name, path in folders.strategies(project_path):
+            _remove_csv(path)
+
+
+def _reencode_stored(project_path, canonical, canonical_order):
+    """Encode the strategies only kept in the store for a new execution table.
+
+    They are decoded with the former table, hence this must happen before it
+    is replaced.
+
+    :return: dict of CSV filename to the rows in `canonical`
+    """
+    stored = [(name, path) for name, path in folders.strategies(project_path)
+              if not os.path.exists(path)]
+    lost = [name for name, path in stored if not folders.fresh_permutation(path)]
+    if lost:
+        raise ValueError('Strategies %s have neither a CSV nor an up-to-date permutation'
+                         % ', '.join(lost))
+
+    rows = {}
+    for name, path in stored:
+        LOG.info('Re-encoding %s, whose CSV was removed', name)
+        try:
+            rows[path] = encode(canonical, loader.read_strategy(path), canonical_order)
+        except AssertionError as e:
+            raise ValueError("Strategy %s does not match the new untreated strategy: %s"
+                             % (name, e)) from e
+    return rows
+
+
+def encode(canonical, tests, canonical_order=None):
+    """Find the rows of the canonical table in the order of the strategy.
+
+    :param canonical: the execution table, without column `index`
+    :param tests: the executions of one strategy
+    :param canonical_order: the result of `_order(canonical)`, if already known
+    :return: an int32 array `rows`, such that `canonical.iloc[rows]` follows
+        the order of `tests`
+    """
+    assert len(canonical) == len(tests), 'Strategy has a different number of executions'
+
+    categories = canonical['testName'].cat.categories
+    codes = pd.Categorical(tests['testName'], categories=categories).codes
+    assert (codes >= 0).all(), 'Strategy contains unknown test names'
+
+    if canonical_order is None:
+        canonical_order = _order(canonical, canonical['testName'].cat.codes.values)
+    order = _order(tests, codes)
+
+    for column in KEY:
+        expected = canonical[column].cat.codes.values if column == 'testName' \
+            else canonical[column].values
+        actual = codes if column == 'testName' else tests[column].values
+        assert (expected[canonical_order] == actual[order]).all(), \
+            'Strategy executions differ in column %s' % column
+
+    rows = np.empty(len(tests), dtype=np.int32)
+    rows[order] = canonical_order
+    return rows
+
+
+def _order(df, test_codes):
+    keys = [test_codes if column == 'testName' else df[column].values
+            for column in reversed(KEY)]
+    return np.lexsort(keys)
+
+
+def _remove_csv(path):
+    if not os.path.exists(path):
+        return
+    expected = loader.read_strategy(path, columnar=False)
+    actual = loader.read_strategy(path)
+    # Categories of test names differ in order between the CSV and the store
+    if not actual.astype({'testName': object}).equals(expected.astype({'testName': object})):
+        raise ValueError("Reconstruction of '%s' differs from the CSV" % path)
+    LOG.info('Removing %s', path)
+    os.remove(path)
+    if os.path.exists(folders.columnar(path)):
+        os.remove(folders.columnar(path))
+
+
+@click.command(help=__doc__)
+@click.option('--remove-csv', is_flag=True,
+              help='Delete strategy CSVs after verifying their reconstruction')
+@executor.jobs_option
+def main(remove_csv, jobs):
+    logging.basicConfig(level=logging.INFO)
+    executor.map_projects(encode_project, remove_csv, jobs=jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,7 +20,7 @@ import tqdm
 import altair as alt
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 from testmining.apfd import read_tests
 
 LOG = logging.getLogger(__file__)
@@ -148,10 +148,8 @@ def iterate(df, selectors):
             yield from_project(df, selector)
 
 
-@click.command(help=__doc__)
-@click.option('--selectors', '-s', required=True, multiple=True)
-@click.option('--strategy', required=True)
-def main(selectors, strategy):
+def _handle_project(project_name, project_path, strategy, selectors):
+    LOG.info('Processing %s', project_name)
     available = {
         'fixed': FixedOffset,
         'green': GreenTests,
@@ -160,14 +158,20 @@ def main(selectors, strategy):
     selector_cls = [available.get(name) for name in selectors]
     selector_names = '~'.join(selectors)
 
-    for project_name, project_path in folders.projects():
-        LOG.info('Processing %s', project_name)
-        df = read_tests(folders.strategy(project_path, strategy))
-        result = pd.concat(iterate(df, selector_cls))
-        output = os.path.join(folders.evaluation(project_path),
-                              f'pr-{strategy}-{selector_names}.png')
-        LOG.info('Writing %s', output)
-        chart(result).properties(title=project_name).save(output)
+    df = read_tests(folders.strategy(project_path, strategy))
+    result = pd.concat(iterate(df, selector_cls))
+    output = os.path.join(folders.evaluation(project_path),
+                          f'pr-{strategy}-{selector_names}.png')
+    LOG.info('Writing %s', output)
+    chart(result).properties(title=project_name).save(output)
+
+
+@click.command(help=__doc__)
+@click.option('--selectors', '-s', required=True, multiple=True)
+@click.option('--strategy', required=True)
+@executor.jobs_option
+def main(selectors, strategy, jobs):
+    executor.map_projects(_handle_project, strategy, selectors, jobs=jobs)
 
 
 if __name__ == '__main__':
@@ -14,6 +14,18 @@ from testmining import cache, loader
 
 KEY_PROJECTS = 'projects'
 
+# Columns of the dump which the aggregation reads
+COLUMNS = [
+    'gh_project_name',
+    'tr_build_id',
+    'tr_log_num_tests_failed',
+    'tr_log_bool_tests_ran',
+    'tr_log_bool_tests_failed',
+    'gh_lang',
+    'tr_log_testduration',
+    'tr_log_buildduration',
+]
+
 
 def project_names(data):
     """Get a frame of unique project names."""
@@ -23,12 +35,12 @@ def project_names(data):
 
 def group_by_project(data):
     """Partition dataset by project."""
-    return data.groupby('gh_project_name')
+    return data.groupby('gh_project_name', observed=True)
 
 
 def jobs(group):
     """How many jobs were submitted for this project?"""
-    return group.size
+    return len(group)
 
 
 def builds(group):
@@ -73,6 +85,7 @@ def average_duration(group):
     return group['tr_log_buildduration'].mean()
 
 
+@cache.memoize(KEY_PROJECTS, indexed=['gh_project_name'])
 def project_statistics(data):
     groups = group_by_project(data)
     projects = pd.DataFrame({
@@ -83,7 +96,7 @@ def project_statistics(data):
         'gh_lang': groups.apply(language),
         'avg_test_duration': groups.apply(average_test_duration),
         'avg_build_duration': groups.apply(average_duration),
-    })
+    }).sort_index()  # grouping by categories keeps the order of appearance
 
     projects['relative_failed_jobs'] = projects['test_failures'] / projects['jobs']
     return projects
@@ -92,9 +105,8 @@ def project_statistics(data):
 @click.command(help=__doc__)
 @click.option('--filename', '-f', required=True)
 def main(filename):
-    data = loader.read_dump(filename)
-    statistics = project_statistics(data)
-    cache.write(KEY_PROJECTS, statistics)
+    data = loader.read_jobs(filename, columns=COLUMNS)
+    project_statistics(data)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,8 @@ Derive per pull request statistics.
 
 import pandas as pd
 
+KEY_PULL_REQUESTS = 'pull_requests'
+
 
 def group_by_pull_request(data):
     pull_requests = data['gh_is_pr']
@@ -13,7 +13,7 @@ import rbo
 
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, loader, executor
 
 LOG = logging.getLogger(__file__)
 
@@ -31,7 +31,7 @@ def report_rbo(project_path):
     for job_id in df1_groups.keys():
         series1 = df1.loc[df1_groups[job_id]]['testName'].drop_duplicates()
         series2 = df2.loc[df2_groups[job_id]]['testName'].drop_duplicates()
-        rbo_ext = rbo.RankingSimilarity(series1.values, series2.values).rbo_ext()
+        rbo_ext = rbo.RankingSimilarity(series1.to_numpy(), series2.to_numpy()).rbo_ext()
         result.append([job_id, rbo_ext])
 
     df = pd.DataFrame(result, columns=['travisJobId', 'rbo'])
@@ -40,9 +40,8 @@ def report_rbo(project_path):
 
 
 def read_test_names(project_path, strategy):
-    cols = ['travisJobId', 'testName']
-    return pd.read_csv(folders.strategy(project_path, strategy),
-                       usecols=cols)[cols]
+    return loader.read_strategy(folders.strategy(project_path, strategy),
+                                ['travisJobId', 'testName'])
 
 
 def write(df, project_path):
@@ -51,12 +50,15 @@ def write(df, project_path):
     #LOG.info('Written %s', output)
 
 
+def _report_project(_, project_path):
+    return report_rbo(project_path)
+
+
 @click.command(help=__doc__)
-def main():
-    rbo_values = []
-    for project_name, project_path in folders.projects():
-        rbo_value = report_rbo(project_path)
-        rbo_values.append(rbo_value)
+@executor.jobs_option
+def main(jobs):
+    rbo_values = executor.map_projects(_report_project, jobs=jobs)
+    for (project_name, _), rbo_value in zip(folders.projects(), rbo_values):
         print("%-20s %.3f" % (project_name, rbo_value.median()))
     all_rbo = pd.concat(rbo_values)
     #import numpy as np
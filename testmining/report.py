@@ -8,19 +8,19 @@ import click
 
 import pandas as pd
 
-from testmining import folders
-from testmining.util import connection
+from testmining import database, folders, loader
 
 
 def report_simple(project_path):
-    df = pd.read_csv(folders.strategy(project_path, 'untreated'))
+    df = loader.read_strategy(folders.strategy(project_path, 'untreated'),
+                              ['testName', 'failures', 'errors'])
     tc = len(df[(df['errors'] > 0) | (df['failures'] > 0)]['testName'].unique())
     print('Distinct failing TC %.2f' % tc)
 
 
 def report_tests(project_name, project_path):
     df = pd.read_csv(folders.strategy(project_path, 'untreated'))
-    with connection() as conn:
+    with database.connect() as conn:
         jobs = job_count(conn, project_name)
         red = red_job_count(df)
         print('Ratio: %.2f' % (red / float(jobs)))
@@ -52,8 +52,14 @@ def failed_count(df):
 
 
 def failed_job_count_per_build(conn, project_name):
-    with conn.cursor() as c:
-        c.execute("""
+    """Average the jobs per build which have test results.
+
+    :raise ValueError: on the embedded database, whose test results only cover red jobs
+    """
+    if database.is_sqlite(conn):
+        raise ValueError('The embedded database only has test results of red jobs, '
+                         'hence it cannot count the jobs with tests per build')
+    result = database.query(conn, """
         SELECT AVG(jobs_with_test)
         FROM (
             SELECT tt.tr_build_id, COUNT(tt.tr_job_id) as jobs_with_test
@@ -67,20 +73,19 @@ def failed_job_count_per_build(conn, project_name):
         ) AS build_to_test_jobs
         """, (project_name.replace('@', '/'),))
 
-        avg = next(c)[0]
-        print('Average test jobs per build: %f' % avg)
+    avg = result.iloc[0, 0]
+    print('Average test jobs per build: %f' % avg)
 
 
 def job_count(conn, project_name):
-    with conn.cursor() as c:
-        c.execute("""
+    result = database.query(conn, """
         SELECT COUNT(tr_job_id)
         FROM travistorrent_8_2_2017
         WHERE gh_project_name = %s
         """, (project_name.replace('@', '/'), ))
-        count = next(c)[0]
-        print('Job count: %d' % count)
-        return count
+    count = result.iloc[0, 0]
+    print('Job count: %d' % count)
+    return count
 
 
 def report_changesets(project_path):
@@ -12,7 +12,7 @@ import click
 import numpy as np
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 
 LOG = logging.getLogger(__file__)
 
@@ -49,11 +49,15 @@ def _check(project_name, df):
         LOG.info("Completed checks without errors")
 
 
+def _check_project(project_name, project_path):
+    df = pd.read_csv(folders.apfd(project_path))
+    _check(project_name, df)
+
+
 @click.command()
-def main():
-    for project_name, project_path in folders.projects():
-        df = pd.read_csv(folders.apfd(project_path))
-        _check(project_name, df)
+@executor.jobs_option
+def main(jobs):
+    executor.map_projects(_check_project, jobs=jobs)
 
 
 if __name__ == "__main__":
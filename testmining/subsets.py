@@ -6,7 +6,7 @@ import click
 
 import pandas as pd
 
-from testmining import folders, apfd_plot
+from testmining import folders, apfd_plot, executor
 
 
 @click.group()
@@ -14,106 +14,107 @@ def cli():
     pass
 
 
-@cli.command()
-def compare_push_strategies():
+def _push_strategies(project_name, project_path):
     pattern = "(travisJobId|recently-failed|matrix-file-similarity|push-matrix-file-similarity)"
-    for project_name, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path)).filter(regex=pattern)
-        output = os.path.join(folders.evaluation(project_path),
-                              'push-%s.png' % project_name)
-        apfd_plot.save_box_plot('Push Commit Training %s' % project_name,
-                                project_path,
-                                apfd,
-                                output)
+    apfd = pd.read_csv(folders.apfd(project_path)).filter(regex=pattern)
+    output = os.path.join(folders.evaluation(project_path),
+                          'push-%s.png' % project_name)
+    apfd_plot.save_box_plot('Push Commit Training %s' % project_name,
+                            project_path,
+                            apfd,
+                            output)
 
 
 @cli.command()
-def compare_one_strategy_to_baseline():
-    for project_name, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path))[[
-            'travisJobId',
-            'random',
-            'recently-failed',
-            'matrix-recently-changed',
-        ]]
-        output = os.path.join(folders.evaluation(project_path),
-                              'matrix-rc-%s.png' % project_name)
-        apfd_plot.save_box_plot('Matrix Recently Changed in %s' % project_name,
-                                project_path,
-                                apfd,
-                                output)
+@executor.jobs_option
+def compare_push_strategies(jobs):
+    executor.map_projects(_push_strategies, jobs=jobs)
+
+
+def _one_strategy_to_baseline(project_name, project_path):
+    apfd = pd.read_csv(folders.apfd(project_path))[[
+        'travisJobId',
+        'random',
+        'recently-failed',
+        'matrix-recently-changed',
+    ]]
+    output = os.path.join(folders.evaluation(project_path),
+                          'matrix-rc-%s.png' % project_name)
+    apfd_plot.save_box_plot('Matrix Recently Changed in %s' % project_name,
+                            project_path,
+                            apfd,
+                            output)
+
+
+@cli.command()
+@executor.jobs_option
+def compare_one_strategy_to_baseline(jobs):
+    executor.map_projects(_one_strategy_to_baseline, jobs=jobs)
+
+
+def _subset(project_path, jobs_filename):
+    apfd = pd.read_csv(folders.apfd(project_path))[[
+        'travisJobId',
+        'recently-failed',
+        'matrix-recently-changed',
+    ]]
+    jobs = pd.read_csv(jobs_filename)
+    mask = apfd['travisJobId'].isin(jobs['tr_job_id'])
+    return apfd[mask]
+
+
+def _offenders(_, project_path):
+    return _subset(project_path, folders.offenders(project_path))
+
+
+def _pull_requests(_, project_path):
+    return _subset(project_path, folders.pull_requests(project_path))
+
+
+def _save_offenders(project_name, project_path):
+    output = os.path.join(folders.evaluation(project_path), 'offenders-%s.png' % project_name)
+    apfd_plot.save_box_plot('Offenders in %s' % project_name,
+                            project_path,
+                            _offenders(project_name, project_path),
+                            output)
 
 
 @cli.command('offenders')
-def offenders_main():
-    for project_name, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path))[[
-            'travisJobId',
-            'recently-failed',
-            'matrix-recently-changed',
-        ]]
-        offenders = pd.read_csv(folders.offenders(project_path))
-        mask = apfd['travisJobId'].isin(offenders['tr_job_id'])
-        output = os.path.join(folders.evaluation(project_path), 'offenders-%s.png' % project_name)
-        apfd_plot.save_box_plot('Offenders in %s' % project_name,
-                                project_path,
-                                apfd[mask],
-                                output)
+@executor.jobs_option
+def offenders_main(jobs):
+    executor.map_projects(_save_offenders, jobs=jobs)
 
 
 @cli.command()
 @click.option('--output', required=True)
-def offenders_combined(output):
-    dfs = []
-    for _, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path))[[
-            'travisJobId',
-            'recently-failed',
-            'matrix-recently-changed',
-        ]]
-        offenders = pd.read_csv(folders.offenders(project_path))
-        mask = apfd['travisJobId'].isin(offenders['tr_job_id'])
-        dfs.append(apfd[mask])
-
-    df = pd.concat(dfs)
+@executor.jobs_option
+def offenders_combined(output, jobs):
+    df = pd.concat(executor.map_projects(_offenders, jobs=jobs))
     apfd_plot.save_box_plot('Offenders',
                             None,
                             df,
                             output)
 
 
+def _save_pull_requests(project_name, project_path):
+    output = os.path.join(folders.evaluation(project_path), 'pr-%s.png' % project_name)
+    apfd_plot.save_box_plot('PRs in %s' % project_name,
+                            project_path,
+                            _pull_requests(project_name, project_path),
+                            output)
+
+
 @cli.command()
-def pull_requests():
-    for project_name, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path))[[
-            'travisJobId',
-            'recently-failed',
-            'matrix-recently-changed',
-        ]]
-        pr = pd.read_csv(folders.pull_requests(project_path))
-        mask = apfd['travisJobId'].isin(pr['tr_job_id'])
-        output = os.path.join(folders.evaluation(project_path), 'pr-%s.png' % project_name)
-        apfd_plot.save_box_plot('PRs in %s' % project_name,
-                                project_path,
-                                apfd[mask],
-                                output)
+@executor.jobs_option
+def pull_requests(jobs):
+    executor.map_projects(_save_pull_requests, jobs=jobs)
 
 
 @cli.command()
 @click.option('--output', required=True)
-def pull_requests_combined(output):
-    dfs = []
-    for _, project_path in folders.projects():
-        apfd = pd.read_csv(folders.apfd(project_path))[[
-            'travisJobId',
-            'recently-failed',
-            'matrix-recently-changed',
-        ]]
-        pr = pd.read_csv(folders.pull_requests(project_path))
-        mask = apfd['travisJobId'].isin(pr['tr_job_id'])
-        dfs.append(apfd[mask])
-
-    df = pd.concat(dfs)
+@executor.jobs_option
+def pull_requests_combined(output, jobs):
+    df = pd.concat(executor.map_projects(_pull_requests, jobs=jobs))
     apfd_plot.save_box_plot('Pull Requests', None, df, output)
 
 
@@ -0,0 +1,414 @@
+# -*- encoding: utf-8 -*-
+
+"""
+Generate a synthetic, TravisTorrent-shaped data set for scale testing.
+
+Writes into the base folder (PRIO_BASE), for every project:
+- the strategy CSVs of the baseline (untreated, random, recently-failed,
+  optimal-failure, optimal-failure-duration)
+- the APFD CSV of the evaluation
+- offenders, pull request and patches CSVs
+- matrix JSON files, which count how often a file change coincided with a
+  failing test
+
+and, for all projects together, the TravisTorrent CSV as well as the aggregates
+in the cache (see `testmining.aggregates`).
+
+Only jobs with failing tests appear in the strategy CSVs, as in the real data.
+Generation is seeded, and test executions and jobs are written in batches, such
+that the size of the output is not limited by memory.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+
+import click
+
+import numpy as np
+import pandas as pd
+
+from testmining import aggregates, apfd_computation, folders, util
+
+LOG = logging.getLogger(__file__)
+
+STRATEGY_COLUMNS = [
+    'travisBuildNumber',
+    'travisBuildId',
+    'travisJobId',
+    'testName',
+    'index',
+    'duration',
+    'count',
+    'failures',
+    'errors',
+    'skipped',
+]
+
+DUMP_COLUMNS = [
+    'tr_build_id',
+    'gh_project_name',
+    'gh_is_pr',
+    'gh_pr_created_at',
+    'gh_pull_req_num',
+    'gh_lang',
+    'git_merged_with',
+    'git_branch',
+    'gh_first_commit_created_at',
+    'git_all_built_commits',
+    'git_num_all_built_commits',
+    'tr_virtual_merged_into',
+    'gh_pushed_at',
+    'gh_build_started_at',
+    'tr_status',
+    'tr_duration',
+    'tr_build_number',
+    'tr_job_id',
+    'tr_log_bool_tests_ran',
+    'tr_log_bool_tests_failed',
+    'tr_log_num_tests_failed',
+    'tr_log_testduration',
+    'tr_log_buildduration',
+]
+
+STRATEGIES = [
+    'untreated',
+    'random',
+    'recently-failed',
+    'optimal-failure',
+    'optimal-failure-duration',
+]
+
+
+class Settings:
+    """Knobs of the generator, shared by all projects."""
+
+    # pylint: disable=too-many-arguments,too-few-public-methods
+    def __init__(self, builds=1000, jobs_per_build=3, tests=200, failure_rate=0.2,
+                 failing_tests=2.0, test_churn=0.05, file_churn=3.0, files=500,
+                 pr_rate=0.2, batch=1000):
+        self.builds = builds
+        self.jobs_per_build = jobs_per_build
+        self.tests = tests
+        self.failure_rate = failure_rate
+        self.failing_tests = failing_tests
+        self.test_churn = test_churn
+        self.file_churn = file_churn
+        self.files = files
+        self.pr_rate = pr_rate
+        self.batch = batch
+
+
+class ProjectGenerator:
+    """Simulate the build history of one project."""
+
+    def __init__(self, project_name, settings, rng, first_id):
+        self.project_name = project_name
+        self.repository = project_name.split('@')[1]
+        self.settings = settings
+        self.rng = rng
+        self.next_id = first_id
+        self.tests = np.array([self._test_name(k) for k in range(settings.tests)], dtype=object)
+        self.files = [self._file_name(k) for k in range(settings.files)]
+        self.last_failed = {}
+        # Changed file -> test name -> how often the test failed with the change
+        self.matrix = {}
+
+    def _test_name(self, k):
+        return 'org.example.%s.pkg%d.Class%dTest' % (self.repository, k % 17, k)
+
+    def _file_name(self, k):
+        return 'src/main/java/org/example/%s/pkg%d/Class%d.java' % (self.repository, k % 17, k)
+
+    def _sha(self, build_id, k):
+        return hashlib.sha1(b'%d:%d' % (build_id, k)).hexdigest()
+
+    def builds(self):
+        """Yield the build, its jobs with their test executions, and changed files per commit."""
+        started_at = pd.Timestamp('2013-01-01')
+        settings = self.settings
+        for number in range(1, settings.builds + 1):
+            if self.rng.random_sample() < settings.test_churn:
+                self.tests = np.append(self.tests, self._test_name(len(self.tests)))
+
+            build_id = self.next_id
+            job_count = self.rng.randint(1, settings.jobs_per_build + 1)
+            self.next_id += job_count + 1
+
+            commits = [self._sha(build_id, k) for k in range(self.rng.randint(1, 4))]
+            changes = {sha: self._changed_files() for sha in commits}
+            is_pr = self.rng.random_sample() < settings.pr_rate
+            red = self.rng.random_sample() < settings.failure_rate
+
+            duration = float(self.rng.randint(60, 1800))
+            build = {
+                'tr_build_id': build_id,
+                'tr_build_number': number,
+                'gh_project_name': util.db_project_name(self.project_name),
+                'gh_is_pr': is_pr,
+                'gh_pull_req_num': float(self.rng.randint(1, 500)) if is_pr else np.nan,
+                'git_branch': 'feature' if is_pr else 'master',
+                'gh_build_started_at': started_at,
+                'tr_duration': duration,
+                'git_all_built_commits': commits,
+            }
+            started_at += pd.Timedelta(seconds=duration + self.rng.randint(600, 86400))
+
+            jobs = []
+            for k in range(job_count):
+                job_id = build_id + k + 1
+                executions = self._executions(number, build_id, job_id) if red else None
+                jobs.append((job_id, executions))
+
+            yield build, jobs, changes
+            self._update_history(number, jobs, changes)
+
+    def _changed_files(self):
+        count = max(1, self.rng.poisson(self.settings.file_churn))
+        chosen = self.rng.choice(len(self.files), size=min(count, len(self.files)), replace=False)
+        return [self.files[k] for k in chosen]
+
+    def _executions(self, number, build_id, job_id):
+        """Test executions of a red job as dict of columns.
+
+        Green jobs are not part of the strategy files, hence not generated."""
+        n = len(self.tests)
+        failures = np.zeros(n, dtype=int)
+        errors = np.zeros(n, dtype=int)
+        failing = self._failing_tests(n)
+        amount = 1 + self.rng.poisson(1, len(failing))
+        as_error = self.rng.random_sample(len(failing)) < 0.3
+        failures[failing[~as_error]] = amount[~as_error]
+        errors[failing[as_error]] = amount[as_error]
+        return {
+            'travisBuildNumber': np.full(n, number),
+            'travisBuildId': np.full(n, build_id),
+            'travisJobId': np.full(n, job_id),
+            'testName': self.tests,
+            'duration': np.round(self.rng.lognormal(-2, 1.5, n), 3),
+            'count': 1 + self.rng.poisson(5, n),
+            'failures': failures,
+            'errors': errors,
+            'skipped': (self.rng.random_sample(n) < 0.02).astype(int),
+        }
+
+    def test_duration(self):
+        """Total test duration of a green job."""
+        return float(np.round(self.rng.lognormal(-2, 1.5, len(self.tests)), 3).sum())
+
+    def _failing_tests(self, n):
+        """Prefer tests which failed recently, such that history-based orders pay off."""
+        count = min(n, 1 + self.rng.poisson(self.settings.failing_tests - 1))
+        weights = np.ones(n)
+        for test, _ in sorted(self.last_failed.items(), key=lambda item: -item[1])[:10]:
+            weights[test] = 20.
+        return self.rng.choice(n, size=count, replace=False, p=weights / weights.sum())
+
+    def _update_history(self, number, jobs, changes):
+        changed = [name for files in changes.values() for name in files]
+        for _, executions in jobs:
+            if executions is None:
+                continue
+            failed = np.flatnonzero(executions['failures'] + executions['errors'])
+            for test in failed:
+                self.last_failed[test] = number
+                for name in changed:
+                    failures = self.matrix.setdefault(name, {})
+                    failures[self.tests[test]] = failures.get(self.tests[test], 0) + 1
+
+    def orders(self, executions):
+        """Order the executions of one job according to each strategy."""
+        red = executions['failures'] + executions['errors']
+        duration = executions['duration']
+        n = len(red)
+        last_failed = np.array([self.last_failed.get(k, -1) for k in range(n)])
+        return {
+            'untreated': np.arange(n),
+            'random': self.rng.permutation(n),
+            'recently-failed': np.lexsort((np.arange(n), -last_failed)),
+            'optimal-failure': np.lexsort((np.arange(n), -red)),
+            'optimal-failure-duration': np.lexsort((duration, (red == 0))),
+        }
+
+    def matrix_json(self, job_id, changes):
+        """Past failures of any test together with the files changed in this build."""
+        changed = dict.fromkeys(name for files in changes.values() for name in files)
+        entries = []
+        for file_name in changed:
+            for test_name, count in self.matrix.get(file_name, {}).items():
+                entries.append({'fileName': file_name, 'testName': test_name})
+                entries.append(count)
+        return {'jobId': str(job_id), 'matrix': entries}
+
+
+def generate_project(project_name, settings, seed, first_id, dump):
+    """Write all per-project files and append the jobs to the open dump.
+
+    :return: the first id after the ids of the project
+    """
+    rng = np.random.RandomState(seed)
+    generator = ProjectGenerator(project_name, settings, rng, first_id)
+    project_path = folders.project(project_name)
+    os.makedirs(os.path.join(project_path, folders.qualifier()), exist_ok=True)
+    matrix_folder = os.path.join(project_path, 'matrix-unit')
+    os.makedirs(matrix_folder, exist_ok=True)
+
+    with contextlib.ExitStack() as stack:
+        handles = {name: stack.enter_context(open(folders.strategy(project_path, name), 'w',
+                                                  encoding='utf-8'))
+                   for name in STRATEGIES}
+        patches = stack.enter_context(open(folders.patches(project_path), 'w', encoding='utf-8'))
+        for handle in handles.values():
+            handle.write(','.join(STRATEGY_COLUMNS) + '\n')
+        patches.write('sha,name\n')
+
+        records, offenders, pull_requests = [], [], []
+        batch = {name: [] for name in STRATEGIES}
+        batched = 0
+        # Like `filter_jobs.query_offenders`: red jobs, unless a job of the preceding build is green
+        green_builds = set()
+
+        for build, jobs, changes in generator.builds():
+            for sha, files in changes.items():
+                patches.writelines('%s,%s\n' % (sha, name) for name in files)
+
+            for job_id, executions in jobs:
+                if executions is None:
+                    records.append(_job_record(build, job_id, 0, generator.test_duration()))
+                    green_builds.add(build['tr_build_number'])
+                    continue
+                red = executions['failures'] + executions['errors']
+                records.append(_job_record(build, job_id, int(np.count_nonzero(red)),
+                                           float(executions['duration'].sum())))
+                if not red.any():
+                    green_builds.add(build['tr_build_number'])
+                elif build['tr_build_number'] - 1 not in green_builds:
+                    offenders.append(job_id)
+                if build['gh_is_pr']:
+                    pull_requests.append(job_id)
+                for name, order in generator.orders(executions).items():
+                    ordered = {column: values[order] for column, values in executions.items()}
+                    ordered['index'] = np.arange(len(order))
+                    batch[name].append(ordered)
+                with open(os.path.join(matrix_folder, '%d.json' % job_id), 'w',
+                          encoding='utf-8') as f:
+                    json.dump(generator.matrix_json(job_id, changes), f)
+                batched += 1
+
+                if batched >= settings.batch:
+                    _flush(handles, batch)
+                    batched = 0
+
+            if len(records) >= settings.batch:
+                _write_jobs(dump, records)
+
+        _flush(handles, batch)
+        _write_jobs(dump, records)
+
+    pd.DataFrame({'tr_job_id': offenders}).to_csv(folders.offenders(project_path), index=False)
+    pd.DataFrame({'tr_job_id': pull_requests}).to_csv(folders.pull_requests(project_path),
+                                                      index=False)
+    LOG.info('Generated %s', project_name)
+    return generator.next_id
+
+
+def _flush(handles, batch):
+    for name, jobs in batch.items():
+        if jobs:
+            df = pd.DataFrame({column: np.concatenate([job[column] for job in jobs])
+                               for column in STRATEGY_COLUMNS})
+            df.to_csv(handles[name], header=False, index=False)
+            jobs.clear()
+
+
+def _job_record(build, job_id, failed, test_duration):
+    red = failed > 0
+    return {
+        'tr_build_id': build['tr_build_id'],
+        'gh_project_name': build['gh_project_name'],
+        'gh_is_pr': build['gh_is_pr'],
+        'gh_pr_created_at': build['gh_build_started_at'] if build['gh_is_pr'] else pd.NaT,
+        'gh_pull_req_num': build['gh_pull_req_num'],
+        'gh_lang': 'java',
+        'git_merged_with': 'unknown' if build['gh_is_pr'] else np.nan,
+        'git_branch': build['git_branch'],
+        'gh_first_commit_created_at': build['gh_build_started_at'],
+        'git_all_built_commits': build['git_all_built_commits'],
+        'git_num_all_built_commits': len(build['git_all_built_commits']),
+        'tr_virtual_merged_into': np.nan,
+        'gh_pushed_at': build['gh_build_started_at'],
+        'gh_build_started_at': build['gh_build_started_at'],
+        'tr_status': 'failed' if red else 'passed',
+        'tr_duration': build['tr_duration'],
+        'tr_build_number': build['tr_build_number'],
+        'tr_job_id': job_id,
+        'tr_log_bool_tests_ran': True,
+        'tr_log_bool_tests_failed': red,
+        'tr_log_num_tests_failed': failed,
+        'tr_log_testduration': test_duration,
+        'tr_log_buildduration': test_duration + 30.,
+    }
+
+
+def _write_jobs(dump, records):
+    """Append job records to the dump, in the format of the TravisTorrent CSV."""
+    jobs = pd.DataFrame(records, columns=DUMP_COLUMNS)
+    jobs['git_all_built_commits'] = jobs['git_all_built_commits'].str.join('#')
+    for column in ['gh_is_pr', 'tr_log_bool_tests_ran', 'tr_log_bool_tests_failed']:
+        jobs[column] = jobs[column].map({True: 'TRUE', False: 'FALSE'})
+    # Explicit format, else batches of midnight timestamps would be written as dates
+    for column in ['gh_pr_created_at', 'gh_first_commit_created_at', 'gh_pushed_at',
+                   'gh_build_started_at']:
+        jobs[column] = pd.to_datetime(jobs[column]).dt.strftime('%Y-%m-%d %H:%M:%S')
+    jobs.to_csv(dump, header=False, index=False, na_rep='NA')
+    records.clear()
+
+
+@click.command(help=__doc__)
+@click.option('--projects', 'project_count', default=2, show_default=True)
+@click.option('--builds', 'build_count', default=1000, show_default=True,
+              help='Builds per project')
+@click.option('--jobs-per-build', default=3, show_default=True, help='Maximum jobs per build')
+@click.option('--tests', 'test_count', default=200, show_default=True,
+              help='Initial number of test classes per project')
+@click.option('--failure-rate', default=0.2, show_default=True,
+              help='Probability of a build with failing tests')
+@click.option('--failing-tests', default=2.0, show_default=True,
+              help='Mean number of failing tests in a red job')
+@click.option('--test-churn', default=0.05, show_default=True,
+              help='Probability that a build adds a test class')
+@click.option('--file-churn', default=3.0, show_default=True,
+              help='Mean number of changed files per commit')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--apfd/--no-apfd', default=True, help='Compute the APFD CSVs')
+def main(project_count, build_count, jobs_per_build, test_count, failure_rate,
+         failing_tests, test_churn, file_churn, seed, apfd):
+    # pylint: disable=too-many-arguments
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings(builds=build_count,
+                        jobs_per_build=jobs_per_build,
+                        tests=test_count,
+                        failure_rate=failure_rate,
+                        failing_tests=failing_tests,
+                        test_churn=test_churn,
+                        file_churn=file_churn)
+
+    os.makedirs(folders.base_folder(), exist_ok=True)
+    filename = folders.travis_torrent()
+    first_id = 1000000
+    with open(filename, 'w', encoding='utf-8') as dump:
+        dump.write(','.join(DUMP_COLUMNS) + '\n')
+        for k in range(project_count):
+            project_name = 'synthetic@project%d' % k
+            first_id = generate_project(project_name, settings, seed + k, first_id, dump)
+            if apfd:
+                apfd_computation.process_project(project_name, folders.project(project_name))
+    LOG.info('Written %s', filename)
+
+    aggregates.write(filename, aggregates.aggregate(filename))
+
+
+if __name__ == '__main__':
+    main()
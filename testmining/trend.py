@@ -7,7 +7,7 @@ import click
 import altair as alt
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, loader, executor
 
 LOG = logging.getLogger(__file__)
 
@@ -45,7 +45,8 @@ def apfd_scatter():
 def collect_tests():
     frames = []
     for project_name, project_path in folders.projects():
-        raw = pd.read_csv(folders.strategy(project_path, 'untreated'))
+        raw = loader.read_strategy(folders.strategy(project_path, 'untreated'),
+                                   ['travisBuildNumber', 'count'])
         df = raw.groupby('travisBuildNumber').agg({'count': 'sum'}).reset_index()
         df['project'] = project_name.split('@')[1]
         df['count'] = df['count'].rolling(50, min_periods=1).mean()
@@ -61,13 +62,17 @@ def tc_line():
     )
 
 
+def _save_trend(project_name, project_path):
+    df = read_trend(project_name, project_path)
+    chart = apfd_line().properties(data=df)
+    output = os.path.join(folders.evaluation(project_path), 'apfd-trend.png')
+    chart.save(output)
+
+
 @click.command()
-def main():
-    for project_name, project_path in folders.projects():
-        df = read_trend(project_name, project_path)
-        chart = apfd_line().properties(data=df)
-        output = os.path.join(folders.evaluation(project_path), 'apfd-trend.png')
-        chart.save(output)
+@executor.jobs_option
+def main(jobs):
+    executor.map_projects(_save_trend, jobs=jobs)
 
 
 if __name__ == '__main__':
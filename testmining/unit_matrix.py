@@ -12,7 +12,7 @@ import click
 
 import pandas as pd
 
-from testmining import folders
+from testmining import folders, executor
 
 LOG = logging.getLogger(__file__)
 
@@ -42,16 +42,19 @@ def process(cache, project_path):
     return pd.DataFrame(rows, columns=['travisJobId', 'fileCount', 'testCount'])
 
 
+def _process_project(project_name, project_path, cache):
+    LOG.info('Processing %s', project_name)
+    df = process(cache, project_path)
+    return df['testCount'] / df['fileCount']
+
+
 @click.command(help=__doc__)
 @click.option('--cache', required=True)
-def main(cache):
+@executor.jobs_option
+def main(cache, jobs):
     logging.basicConfig(level=logging.INFO)
-    values = []
-    for project_name, project_path in folders.projects():
-        LOG.info('Processing %s', project_name)
-        df = process(cache, project_path)
-        value = df['testCount'] / df['fileCount']
-        values.append(value)
+    values = executor.map_projects(_process_project, cache, jobs=jobs)
+    for value in values:
         print(value.median())
     print("Overall median: %f" % pd.concat(values).median())
 
@@ -1,4 +1,6 @@
 # -*- encoding: utf-8 -*-
+import contextlib
+import hashlib
 import os
 import psycopg2
 import pandas as pd
@@ -23,6 +25,55 @@ def find_files(base_dir, file_regex, converter=str):
     return filenames
 
 
+@contextlib.contextmanager
+def atomic_output(filename):
+    """Write a file such that readers see either the old or the new content.
+
+    Yields a temporary filename in the same directory, which replaces
+    `filename` once the block completes without error.
+    """
+    temporary = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        yield temporary
+        os.replace(temporary, filename)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def file_digest(filename, block_size=1 << 20):
+    """Compute the SHA-1 checksum of a file's content, reading block by block."""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def filters(where):
+    """Convert a query of column (or index) names to values into Parquet filters.
+
+    :param where: dict of name to a value, or to a list of values
+    :return: filters in disjunctive normal form for `pyarrow.parquet.read_table`
+    """
+    if not where:
+        return None
+    return [(name, 'in', list(value)) if isinstance(value, (list, tuple, set))
+            else (name, '==', value)
+            for name, value in where.items()]
+
+
+def select(df, where, columns=None):
+    """Evaluate a query like for `filters` in memory."""
+    for name, value in (where or {}).items():
+        values = df.index.get_level_values(name) if name in df.index.names else df[name]
+        if isinstance(value, (list, tuple, set)):
+            df = df[values.isin(list(value))]
+        else:
+            df = df[values == value]
+    return df if columns is None else df[columns]
+
+
 def print_df(df):
     # https://pandas.pydata.org/pandas-docs/stable/user_guide/options.html#available-options
     with pd.option_context('display.max_rows', None,
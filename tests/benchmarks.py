@@ -0,0 +1,225 @@
+# -*- encoding: utf-8 -*-
+"""
+Benchmarks for the hot paths of the evaluation.
+
+Run with `pytest tests/benchmarks.py` (not collected by default, because it
+takes a while). Every benchmark records wall time (best of a few repetitions)
+and peak traced memory per input scale, and appends the results together with
+the current commit to a JSON history. Print the history with
+`python -m tests.benchmarks`.
+
+Inputs are the sample projects, and synthetic variants thereof, which repeat
+every job `scale` times under fresh job, build and build number identifiers.
+"""
+import datetime
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+from testmining import apfd, apfd_computation, budget, failure_distance, folders, heatmap, pr, util
+
+from tests.notebooks import base, output_sample
+
+# pragma pylint: disable=redefined-outer-name
+
+ENV_HISTORY = 'PRIO_BENCHMARK_HISTORY'
+
+SCALES = [1, 4]
+
+SMALL = 'neuland@jade4j'
+
+LARGE = 'square@okhttp'
+
+
+def history_file():
+    return os.getenv(ENV_HISTORY) or \
+        os.path.normpath(os.path.join(base(), '..', '.benchmarks', 'history.json'))
+
+
+def read_history():
+    filename = history_file()
+    if not os.path.exists(filename):
+        return []
+    with open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_history(records):
+    filename = history_file()
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    history = read_history() + records
+    with util.atomic_output(filename) as temporary:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=1)
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=base(),
+                                       stderr=subprocess.DEVNULL,
+                                       encoding='utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+@pytest.fixture(scope='session')
+def records():
+    results = []
+    yield results
+    if results:
+        write_history(results)
+
+
+@pytest.fixture()
+def measure(request, records):
+    revision = commit()
+
+    def run(func, *args, scale=1, repeat=3):
+        wall_time = min(_wall_time(func, args) for _ in range(repeat))
+        peak_memory = _peak_memory(func, args)
+        records.append({
+            'commit': revision,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'benchmark': request.function.__name__,
+            'scale': scale,
+            'wall_time': wall_time,
+            'peak_memory': peak_memory,
+        })
+
+    return run
+
+
+def _wall_time(func, args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def _peak_memory(func, args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def scale_tests(tests, scale):
+    """Repeat all jobs `scale` times with fresh identifiers."""
+    copies = []
+    for k in range(scale):
+        copy = tests.copy()
+        for column in ['travisBuildNumber', 'travisBuildId', 'travisJobId']:
+            if column in copy:
+                copy[column] = copy[column] + k * (tests[column].max() + 1)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def scale_project(project_name, directory, scale):
+    """Copy a sample project with scaled strategy CSVs into `directory`."""
+    source = os.path.join(output_sample(), project_name)
+    target = os.path.join(directory, project_name)
+    os.makedirs(os.path.join(target, folders.qualifier()))
+    for name, path in folders.strategies(source):
+        tests = scale_tests(pd.read_csv(path), scale)
+        tests.to_csv(folders.strategy(target, name), index=False)
+    return target
+
+
+def sample_tests(project_name, strategy, scale=1, jobs=None):
+    tests = apfd.read_tests(folders.strategy(os.path.join(output_sample(), project_name),
+                                             strategy))
+    if jobs:
+        tests = tests[tests['travisJobId'].isin(tests['travisJobId'].unique()[:jobs])]
+    return scale_tests(tests, scale)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_apfd_from_file(measure, tmpdir, scale):
+    project = scale_project(LARGE, str(tmpdir), scale)
+
+    measure(apfd.from_file, folders.strategy(project, 'untreated'), scale=scale)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_process_project(measure, tmpdir, monkeypatch, scale):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    project = scale_project(SMALL, str(tmpdir), scale)
+
+    measure(apfd_computation.process_project, SMALL, project, None, 1, True, scale=scale)
+
+
+@pytest.mark.parametrize('scale', [1, 2])
+def test_pr_iterate(measure, scale):
+    tests = sample_tests(SMALL, 'recently-failed', scale, jobs=10)
+
+    def iterate():
+        return list(pr.iterate(tests, [pr.FixedOffset, pr.GreenTests]))
+
+    measure(iterate, scale=scale, repeat=1)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_budget_compute_percent_detected(measure, scale):
+    tests = sample_tests(SMALL, 'optimal-failure', scale)
+
+    measure(budget.compute_percent_detected, tests, scale=scale)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_rbo_report_rbo(measure, tmpdir, monkeypatch, scale):
+    rbo = pytest.importorskip('testmining.rbo')
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    project = scale_project(SMALL, str(tmpdir), scale)
+
+    measure(rbo.report_rbo, project, scale=scale)
+
+
+def test_failure_distance(measure, tmpdir, monkeypatch):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, output_sample())
+    monkeypatch.setattr(folders, 'cache_folder', lambda: str(tmpdir))
+    builds = failure_distance.failed_builds(sample_tests(SMALL, 'untreated'))
+
+    measure(failure_distance.failure_distances, SMALL, builds, repeat=1)
+
+
+@pytest.mark.parametrize('scale', SCALES)
+def test_strip_prefixes(measure, scale):
+    names = pd.read_csv(os.path.join(output_sample(), LARGE, '%s-patches.csv' % LARGE))['name']
+    names = pd.concat(['copy%d/' % k + names for k in range(scale)], ignore_index=True)
+
+    measure(util.strip_prefixes, names, '/', scale=scale)
+
+
+@pytest.mark.parametrize('scale', [1, 100])
+def test_heatmap_json_to_df(measure, scale):
+    matrix = heatmap.load_json(os.path.join(output_sample(), LARGE, 'matrix-unit', '2685384.json'))
+    entries = []
+    for k in range(scale):
+        for index in range(0, len(matrix['matrix']), 2):
+            key, value = matrix['matrix'][index:index + 2]
+            entries.append(dict(key, fileName='copy%d/%s' % (k, key['fileName'])))
+            entries.append(value)
+
+    measure(heatmap.json_to_df, dict(matrix, matrix=entries), scale=scale)
+
+
+def print_history():
+    """Print the two most recent measurements of every benchmark and scale."""
+    df = pd.DataFrame(read_history())
+    if df.empty:
+        print('No benchmark history in %s' % history_file())
+        return
+    recent = df.groupby(['benchmark', 'scale']).tail(2)
+    util.print_df(recent.set_index(['benchmark', 'scale']).sort_index())
+
+
+if __name__ == '__main__':
+    print_history()
@@ -0,0 +1,11 @@
+# -*- encoding: utf-8 -*-
+import pytest
+
+from testmining import folders
+
+
+@pytest.fixture()
+def base(tmpdir, monkeypatch):
+    """Use an empty temporary directory as base folder."""
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    return tmpdir
@@ -0,0 +1,135 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from testmining import aggregates, builds, loader, projects, pull_requests
+
+from tests.notebooks import output_sample
+
+
+def dump():
+    return os.path.join(output_sample(), 'travistorrent_8_2_2017.csv')
+
+
+def as_objects(df):
+    df = df.copy()
+    if df.index.dtype.name == 'category':
+        df.index = df.index.astype(object)
+    for column in ['gh_project_name', 'gh_lang', 'git_branch']:
+        if column in df:
+            df[column] = df[column].astype(object)
+    return df
+
+
+def test_build_statistics_of_compact_jobs():
+    expected = builds.build_statistics.__wrapped__(loader.read_dump(dump()))
+    jobs, commits = loader.read_jobs(dump(), columns=builds.COLUMNS, chunksize=7, with_commits=True)
+    actual = builds.build_statistics.__wrapped__(jobs, commits)
+
+    pd.testing.assert_frame_equal(as_objects(actual), expected, check_dtype=False)
+
+
+def test_build_commits():
+    data = loader.read_dump(dump())
+    commits = builds.build_commits.__wrapped__(data)
+    counts = builds.build_statistics.__wrapped__(data)['git_num_all_built_commits']
+
+    assert commits['git_commit'].dtype.name == 'category'
+    lists = commits.groupby('tr_build_id')['git_commit'].agg(list)
+    assert lists.tolist() == data.groupby('tr_build_id')['git_all_built_commits'].sum().tolist()
+    assert counts.tolist() == lists.str.len().tolist()
+
+    _, compact = loader.read_jobs(dump(), columns=builds.COLUMNS, chunksize=7, with_commits=True)
+    pd.testing.assert_frame_equal(builds.build_commits.__wrapped__(compact), commits)
+
+
+def test_project_statistics_of_compact_jobs():
+    expected = projects.project_statistics.__wrapped__(loader.read_dump(dump()))
+    jobs = loader.read_jobs(dump(), columns=projects.COLUMNS)
+    actual = projects.project_statistics.__wrapped__(jobs)
+
+    pd.testing.assert_frame_equal(as_objects(actual), expected, check_dtype=False)
+    assert expected['jobs'].sum() == 100
+
+
+@pytest.mark.usefixtures('base')
+def test_memoized_statistics_of_filtered_jobs():
+    jobs = loader.read_jobs(dump(), columns=projects.COLUMNS)
+    assert len(projects.project_statistics(jobs)) == 12
+
+    rails = projects.project_statistics(jobs[jobs['gh_project_name'] == 'rails/rails'])
+    assert rails.index.tolist() == ['rails/rails']
+    assert rails['jobs'].tolist() == [30]
+
+
+def expected_statistics():
+    data = loader.read_dump(dump())
+    return (projects.project_statistics.__wrapped__(data),
+            builds.build_statistics.__wrapped__(data),
+            pull_requests.pull_request_statistics(data),
+            builds.build_commits.__wrapped__(data))
+
+
+def assert_statistics_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for actual_df, expected_df in zip(actual, expected):
+        pd.testing.assert_frame_equal(as_objects(actual_df), expected_df, check_dtype=False)
+
+
+def test_single_pass_aggregation():
+    assert_statistics_equal(aggregates.aggregate(dump(), chunksize=7), expected_statistics())
+
+
+def test_single_pass_aggregation_of_partitions(tmpdir):
+    filename = str(tmpdir.join('travistorrent.csv'))
+    shutil.copy(dump(), filename)
+    loader.write_partitions(filename)
+
+    assert_statistics_equal(aggregates.aggregate(filename, jobs=2), expected_statistics())
+
+
+def test_merge_is_associative():
+    chunks = list(loader.iter_jobs(dump(), aggregates.COLUMNS, chunksize=10))
+    partials = [aggregates.partial(chunk) for chunk in chunks]
+    nested = aggregates.merge([aggregates.merge(partials[:4]), aggregates.merge(partials[4:])])
+
+    assert_statistics_equal(aggregates.finalize(nested),
+                            aggregates.finalize(aggregates.merge(partials)))
+
+
+def write_jobs(filename, jobs, mode='w'):
+    jobs.to_csv(filename, index=False, mode=mode, header=mode == 'w')
+
+
+def test_refresh_appended_jobs(base):
+    jobs = pd.read_csv(dump(), dtype=str, keep_default_na=False)
+    jobs = jobs.sort_values('tr_job_id', key=lambda ids: ids.astype(int))
+    filename = str(base.join('travistorrent.csv'))
+    write_jobs(filename, jobs)
+    expected = aggregates.aggregate(filename)
+
+    write_jobs(filename, jobs[:60])
+    aggregates.refresh(filename, chunksize=7)
+    write_jobs(filename, jobs[60:], mode='a')
+    _, progress = aggregates.read_state(filename)
+    actual = aggregates.refresh(filename, chunksize=7)
+
+    assert progress['length'] < os.path.getsize(filename)
+    assert_statistics_equal(actual, expected)
+    assert aggregates.read_state(filename)[1]['length'] == os.path.getsize(filename)
+
+
+def test_refresh_rewritten_dump(base):
+    jobs = pd.read_csv(dump(), dtype=str, keep_default_na=False)
+    filename = str(base.join('travistorrent.csv'))
+    write_jobs(filename, jobs[:60])
+    aggregates.refresh(filename)
+
+    write_jobs(filename, jobs[40:])
+    assert aggregates.read_state(filename) == (None, None)
+    actual = aggregates.refresh(filename)
+
+    assert_statistics_equal(actual, aggregates.aggregate(filename))
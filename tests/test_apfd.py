@@ -0,0 +1,71 @@
+# -*- encoding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from testmining import apfd
+
+from tests.notebooks import output_sample
+
+# pragma pylint: disable=redefined-outer-name
+
+
+@pytest.fixture()
+def jobs():
+    return pd.DataFrame([
+        (2, 'ATest', 1, 3, 0),
+        (2, 'BTest', 0, 1, 1),
+        (1, 'ATest', 0, 2, 0),
+        (1, 'BTest', 1, 1, 1),
+        (1, 'CTest', 2, 4, 2),
+        (3, 'ATest', 0, 1, 0),
+    ], columns=['travisJobId', 'testName', 'index', 'count', 'red'])
+
+
+def reference(tests):
+    jobs = tests.sort_values('index').groupby('travisJobId')
+    return jobs.apply(lambda job: apfd.apfd(apfd.apfd_plot(job)))
+
+
+def test_job_apfd_matches_trapezoid(jobs):
+    actual = apfd.job_apfd(jobs)
+
+    expected = reference(jobs)
+    assert list(actual.index) == [1, 2, 3]
+    np.testing.assert_allclose(actual.values, expected.values)
+
+
+def test_job_apfd_without_failures(jobs):
+    actual = apfd.job_apfd(jobs)
+
+    assert np.isnan(actual.loc[3])
+
+
+def test_job_apfd_empty(jobs):
+    actual = apfd.job_apfd(jobs[:0])
+
+    assert actual.empty
+
+
+def test_from_file_matches_trapezoid():
+    filename = os.path.join(output_sample(), 'neuland@jade4j', 'baseline',
+                            'jade4j@untreated.csv')
+
+    actual = apfd.from_file(filename)
+
+    expected = reference(apfd.read_tests(filename))
+    pd.testing.assert_index_equal(actual.index, expected.index)
+    np.testing.assert_allclose(actual.values, expected.values)
+
+
+@pytest.mark.parametrize('chunksize', [7, 1000, 10 ** 6])
+def test_from_file_in_chunks(chunksize):
+    filename = os.path.join(output_sample(), 'neuland@jade4j', 'baseline',
+                            'jade4j@untreated.csv')
+
+    actual = apfd.from_file(filename, chunksize)
+
+    expected = apfd.from_file(filename)
+    pd.testing.assert_series_equal(actual, expected)
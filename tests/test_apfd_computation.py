@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from testmining import apfd, apfd_computation, folders
+
+from tests.notebooks import output_sample
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'neuland@jade4j'
+
+
+@pytest.fixture()
+def project(tmpdir, monkeypatch):
+    source = os.path.join(output_sample(), PROJECT, 'baseline')
+    path = tmpdir.join(PROJECT)
+    target = path.join('baseline')
+    target.ensure(dir=True)
+    for strategy in ['untreated', 'random', 'lru']:
+        filename = 'jade4j@%s.csv' % strategy
+        shutil.copy(os.path.join(source, filename), str(target.join(filename)))
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    return str(path)
+
+
+def count_calls(monkeypatch):
+    calls = []
+    original = apfd.from_file
+
+    def from_file(filename, chunksize=None):
+        calls.append(os.path.basename(filename))
+        return original(filename, chunksize)
+
+    monkeypatch.setattr(apfd, 'from_file', from_file)
+    return calls
+
+
+def test_process_project_writes_all_strategies(project):
+    apfd_computation.process_project(PROJECT, project)
+
+    df = pd.read_csv(folders.apfd(project), index_col='travisJobId')
+    assert sorted(df.columns) == ['lru', 'random', 'untreated']
+    assert os.path.exists(folders.apfd_manifest(project))
+
+
+def test_process_project_skips_unchanged(project, monkeypatch):
+    apfd_computation.process_project(PROJECT, project)
+    calls = count_calls(monkeypatch)
+
+    apfd_computation.process_project(PROJECT, project)
+
+    assert not calls
+
+
+def test_process_project_recomputes_added_strategy(project, monkeypatch):
+    apfd_computation.process_project(PROJECT, project)
+    calls = count_calls(monkeypatch)
+    shutil.copy(os.path.join(output_sample(), PROJECT, 'baseline', 'jade4j@bloom.csv'),
+                folders.strategy(project, 'bloom'))
+
+    apfd_computation.process_project(PROJECT, project)
+
+    df = pd.read_csv(folders.apfd(project), index_col='travisJobId')
+    assert calls == ['jade4j@bloom.csv']
+    assert sorted(df.columns) == ['bloom', 'lru', 'random', 'untreated']
+    pd.testing.assert_series_equal(df['bloom'],
+                                   apfd.from_file(folders.strategy(project, 'bloom')),
+                                   check_names=False)
+
+
+def test_process_project_drops_removed_strategy(project):
+    apfd_computation.process_project(PROJECT, project)
+    os.remove(folders.strategy(project, 'lru'))
+
+    apfd_computation.process_project(PROJECT, project)
+
+    df = pd.read_csv(folders.apfd(project), index_col='travisJobId')
+    assert sorted(df.columns) == ['random', 'untreated']
+
+
+def test_process_project_touched_file_is_unchanged(project, monkeypatch):
+    apfd_computation.process_project(PROJECT, project)
+    calls = count_calls(monkeypatch)
+    os.utime(folders.strategy(project, 'lru'), (1, 1))
+
+    apfd_computation.process_project(PROJECT, project)
+
+    assert not calls
@@ -0,0 +1,173 @@
+# -*- encoding: utf-8 -*-
+import os
+
+import pandas as pd
+import pytest
+
+from testmining import cache, executor, folders
+
+from tests.notebooks import output_sample
+
+
+def frame(n):
+    return pd.DataFrame({'a': range(n), 'b': [['x']] * n})
+
+
+def test_write_replaces_entry(base):
+    cache.write('key', frame(3))
+    cache.write('key', frame(5))
+
+    assert len(cache.read('key')) == 5
+    assert len(cache.entries()) == 1
+    assert len(base.join('cache').listdir('*' + cache.ENTRY_EXTENSION)) == 1
+
+
+@pytest.mark.usefixtures('base')
+def test_read_max_age_and_remove():
+    cache.write('key', frame(3))
+
+    assert len(cache.read('key', max_age=60)) == 3
+    with pytest.raises(KeyError):
+        cache.read('key', max_age=0)
+    assert cache.remove('key')
+    assert not cache.remove('key')
+    with pytest.raises(KeyError):
+        cache.read('key')
+
+
+def test_read_missing_key(base):
+    with pytest.raises(KeyError):
+        cache.read('missing')
+    with pytest.raises(KeyError):
+        cache.entry_provenance('missing')
+    assert cache.entries().empty
+    assert not base.join('cache').exists()
+
+
+def test_read_legacy_store(base, monkeypatch):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, output_sample())
+    monkeypatch.setattr(folders, 'cache_folder', lambda: str(base))
+    assert 'gh_project_name' in cache.read('builds')
+
+
+@pytest.mark.usefixtures('base')
+def test_memoize_reuses_result():
+    calls = []
+
+    @cache.memoize('doubled')
+    def doubled(df, factor=2):
+        calls.append(df)
+        return df[['a']] * factor
+
+    assert doubled(frame(3)).a.tolist() == [0, 2, 4]
+    assert doubled(frame(3)).a.tolist() == [0, 2, 4]
+    assert len(calls) == 1
+
+    doubled(frame(3), factor=3)
+    doubled(frame(4))
+    assert len(calls) == 3
+    assert cache.read('doubled').a.tolist() == [0, 2, 4, 6]
+
+
+def test_dump_change_invalidates(base):
+    dump = base.join(os.path.basename(folders.travis_torrent()))
+    dump.write('a')
+    cache.write('key', frame(3))
+
+    dump.write('ab')
+    with pytest.raises(KeyError):
+        cache.read('key')
+    assert cache.compact() > 0
+    assert cache.entries().empty
+
+
+def test_memoize_tracks_dump_of_inputs(base):
+    dump = base.join('elsewhere.csv')
+    dump.write('a')
+    calls = []
+
+    @cache.memoize('doubled')
+    def doubled(df):
+        calls.append(df)
+        return df[['a']] * 2
+
+    data = cache.identify(frame(3), str(dump))
+    doubled(data)
+    base.join(os.path.basename(folders.travis_torrent())).write('a')
+    doubled(data)
+    assert len(calls) == 1
+
+    dump.write('ab')
+    with pytest.raises(KeyError):
+        cache.read('doubled')
+
+
+@pytest.mark.usefixtures('base')
+def test_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(cache, 'ACCESS_RESOLUTION', 0)
+    for key in ['first', 'second', 'third']:
+        cache.write(key, frame(100))
+    cache.read('first')
+
+    size = cache.entries()['size'].max()
+    cache.evict(2 * size)
+
+    assert sorted(cache.entries()['key']) == ['first', 'third']
+
+
+@pytest.mark.usefixtures('base')
+def test_read_records_access_lazily(monkeypatch):
+    cache.write('key', frame(3))
+    index = os.stat(folders.cache_index())
+
+    cache.read('key')
+    assert os.stat(folders.cache_index()) == index
+
+    monkeypatch.setattr(cache, 'ACCESS_RESOLUTION', 0)
+    accessed = cache.entries()['accessed'][0]
+    cache.read('key')
+    assert cache.entries()['accessed'][0] > accessed
+
+
+def write_frame(key, n):
+    cache.write(key, frame(n))
+    cache.write('shared', frame(n))
+    return len(cache.read(key))
+
+
+def test_concurrent_writers(base):
+    tasks = [(str(k), ('key%d' % k, 10 + k)) for k in range(8)]
+    assert executor.run(write_frame, tasks, jobs=4) == [10 + k for k in range(8)]
+
+    entries = cache.entries()
+    assert sorted(entries['key']) == ['key%d' % k for k in range(8)] + ['shared']
+    assert len(base.join('cache').listdir('*' + cache.ENTRY_EXTENSION)) == 9
+    assert cache.compact() == 0
+
+
+@pytest.mark.usefixtures('base')
+def test_read_where():
+    df = pd.DataFrame({
+        'project': ['b', 'a', 'c', 'a'],
+        'value': [1, 2, 3, 4],
+        'commits': [['x'], ['y', 'z'], [], ['w']],
+    }, index=pd.Index([10, 11, 12, 13], name='build'))
+    cache.write('key', df, indexed=['project'])
+
+    a = cache.read('key', where={'project': 'a'}, columns=['value', 'commits'])
+    assert a.index.tolist() == [11, 13]
+    assert a.columns.tolist() == ['value', 'commits']
+    assert a['commits'].tolist() == [['y', 'z'], ['w']]
+
+    assert cache.read('key', where={'project': ['b', 'c']}).index.tolist() == [10, 12]
+    assert cache.read('key', where={'build': 12})['project'].tolist() == ['c']
+    assert len(cache.read('key')) == 4
+
+
+def test_read_legacy_where(base, monkeypatch):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, output_sample())
+    monkeypatch.setattr(folders, 'cache_folder', lambda: str(base))
+    builds = cache.read('builds', where={'gh_project_name': 'square/okhttp'},
+                        columns=['tr_duration'])
+    assert not builds.empty
+    assert builds.columns.tolist() == ['tr_duration']
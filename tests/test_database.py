@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from testmining import database, extraction, filter_jobs, folders, loader
+from testmining import patches, report, synthetic
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'synthetic@project0'
+
+
+@pytest.fixture()
+def base(base, monkeypatch):
+    monkeypatch.setenv(database.ENV_BACKEND, database.SQLITE)
+    result = CliRunner().invoke(synthetic.main, ['--projects', '2', '--builds', '50',
+                                                 '--tests', '20', '--failure-rate', '0.5',
+                                                 '--no-apfd'])
+    assert result.exit_code == 0, result.output
+    database.load(folders.database(), folders.travis_torrent(), chunksize=40)
+    return base
+
+
+@pytest.mark.usefixtures('base')
+def test_load_tables():
+    dump = loader.read_dump(folders.travis_torrent())
+    project_path = folders.project(PROJECT)
+
+    with database.connect() as conn:
+        jobs = (dump['gh_project_name'] == 'synthetic/project0').sum()
+        assert report.job_count(conn, PROJECT) == jobs
+        commits = pd.read_sql('SELECT * FROM tr_all_built_commits', conn)
+        test_results = pd.read_sql('SELECT * FROM tr_test_result', conn)
+        indexes = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'index'", conn)
+
+    assert len(commits) == dump['git_all_built_commits'].str.len().sum()
+    assert len(test_results) == sum(len(loader.read_strategy(folders.strategy(path, 'untreated')))
+                                    for _, path in folders.projects())
+    assert set(indexes['name']) == {'jobs_by_project', 'jobs_by_id', 'commits_by_job',
+                                    'test_results_by_job', 'patches_by_commit'}
+    with database.connect() as conn:
+        offenders = filter_jobs.query_offenders(conn, PROJECT)
+    pd.testing.assert_frame_equal(offenders.sort_values('tr_job_id', ignore_index=True),
+                                  pd.read_csv(folders.offenders(project_path)), check_dtype=False)
+
+
+@pytest.mark.usefixtures('base')
+def test_extract_patches_locally(tmp_path_factory):
+    output = tmp_path_factory.mktemp('patches')
+    tasks = [(name, (name.replace('@', '/'), str(output), 7)) for name, _ in folders.projects()]
+    extraction.run(patches.write_patches, tasks, workers=2)
+
+    def key(df):
+        return df.drop_duplicates().sort_values(['sha', 'name'], ignore_index=True)
+
+    for name, path in folders.projects():
+        expected = pd.read_csv(folders.patches(path))
+        actual = pd.read_csv(patches.patches_file(str(output), name.replace('@', '/')))
+        assert len(actual) > 0
+        pd.testing.assert_frame_equal(key(actual), key(expected))
+
+
+@pytest.mark.usefixtures('base')
+def test_test_results_only_of_red_jobs():
+    """Unlike on the server, jobs whose tests all passed have no test results."""
+    dump = loader.read_dump(folders.travis_torrent())
+    with database.connect() as conn:
+        jobs = pd.read_sql('SELECT DISTINCT tr_job_id FROM tr_test_result', conn)['tr_job_id']
+
+    red = dump.loc[dump['tr_status'] == 'failed', 'tr_job_id']
+    assert set(jobs) == set(red)
+    assert dump['tr_log_bool_tests_ran'].sum() > len(red)
+    with database.connect() as conn:
+        with pytest.raises(ValueError, match='red jobs'):
+            report.failed_job_count_per_build(conn, PROJECT)
+
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setenv(database.ENV_BACKEND, 'oracle')
+    with pytest.raises(ValueError, match='oracle'):
+        database.connect()
+
+
+@pytest.mark.usefixtures('base')
+def test_query_results_are_cached(monkeypatch):
+    statements = []
+
+    def job_count(conn, project_name):
+        count = report.job_count(conn, project_name)
+        return count, len([statement for statement in statements if 'COUNT' in statement])
+
+    with database.connect() as conn:
+        conn.set_trace_callback(statements.append)
+        count, _ = job_count(conn, PROJECT)
+        assert job_count(conn, PROJECT) == (count, 1)
+        assert job_count(conn, 'synthetic@project1')[1] == 2
+
+        assert database.invalidate(match='COUNT(tr_job_id)') == 2
+        assert job_count(conn, PROJECT) == (count, 3)
+        monkeypatch.setenv(database.ENV_QUERY_TTL, '0')
+        assert job_count(conn, PROJECT) == (count, 4)
+        monkeypatch.delenv(database.ENV_QUERY_TTL)
+
+        conn.execute("INSERT INTO travistorrent_8_2_2017 (tr_job_id, gh_project_name) "
+                     "VALUES (1, 'synthetic/project0')")
+        conn.commit()
+        assert job_count(conn, PROJECT) == (count + 1, 5)
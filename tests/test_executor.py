@@ -0,0 +1,32 @@
+# -*- encoding: utf-8 -*-
+import pytest
+
+from testmining import executor
+
+
+def square(x):
+    return x * x
+
+
+def fail(x):
+    raise ValueError(x)
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_run_keeps_order(jobs):
+    tasks = [(str(x), (x,)) for x in range(10)]
+
+    actual = executor.run(square, tasks, jobs)
+
+    assert actual == [x * x for x in range(10)]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_names_failed_task(jobs):
+    tasks = [('first', (1,)), ('second', (2,))]
+
+    with pytest.raises(executor.TaskError) as e:
+        executor.run(fail, tasks, jobs)
+
+    assert e.value.name == 'first'
+    assert isinstance(e.value.__cause__, ValueError)
@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+import functools
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from testmining import executor, extraction, filter_jobs, folders, patches
+
+# pragma pylint: disable=redefined-outer-name
+
+JOBS = [
+    # tr_job_id, gh_project_name, tr_build_number, gh_is_pr
+    (1, 'a/a', 1, '0'),
+    (2, 'a/a', 2, '1'),
+    (3, 'a/a', 3, '0'),
+    (4, 'b/b', 1, '1'),
+]
+
+TEST_RESULTS = [
+    # tr_job_id, failures, errors
+    (1, 0, 0),
+    (2, 1, 0),
+    (3, 0, 2),
+    (4, 1, 0),
+]
+
+
+@pytest.fixture()
+def database(tmpdir, monkeypatch):
+    """SQLite stand-in for the TravisTorrent and GHTorrent tables."""
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    filename = str(tmpdir.join('github.sqlite'))
+    conn = sqlite3.connect(filename)
+    conn.execute('CREATE TABLE travistorrent_8_2_2017 '
+                 '(tr_job_id, gh_project_name, tr_build_number, gh_is_pr)')
+    conn.execute('CREATE TABLE tr_test_result (tr_job_id, failures, errors)')
+    conn.execute('CREATE TABLE tr_all_built_commits (tr_job_id, sha)')
+    conn.execute('CREATE TABLE raw_patches (sha, name)')
+    conn.executemany('INSERT INTO travistorrent_8_2_2017 VALUES (?, ?, ?, ?)', JOBS)
+    conn.executemany('INSERT INTO tr_test_result VALUES (?, ?, ?)', TEST_RESULTS)
+    for job_id, project, _, _ in JOBS:
+        for k in range(5):
+            sha = '%s-%d-%d' % (project[0], job_id, k)
+            conn.execute('INSERT INTO tr_all_built_commits VALUES (?, ?)', (job_id, sha))
+            conn.executemany('INSERT INTO raw_patches VALUES (?, ?)',
+                             [(sha, 'file%d' % n) for n in range(k)])
+    conn.commit()
+    conn.close()
+    return functools.partial(sqlite3.connect, filename, check_same_thread=False)
+
+
+def read_patches(filename):
+    return pd.read_csv(filename).sort_values(['sha', 'name']).reset_index(drop=True)
+
+
+def test_write_patches_concurrently(database, tmpdir):
+    output = str(tmpdir)
+    tasks = [(project, (project, output, 4)) for project in ['a/a', 'b/b']]
+    extraction.run(patches.write_patches, tasks, connect=database, workers=2)
+
+    with database() as conn:
+        expected = patches.patches(conn, patches.commits(conn, 'a/a'), batch_size=100)
+    expected = expected.sort_values(['sha', 'name']).reset_index(drop=True)
+    actual = read_patches(patches.patches_file(output, 'a/a'))
+    assert len(actual) == 3 * (0 + 1 + 2 + 3 + 4)
+    pd.testing.assert_frame_equal(actual, expected)
+    assert len(read_patches(patches.patches_file(output, 'b/b'))) == 0 + 1 + 2 + 3 + 4
+    assert sorted(os.listdir(output)) == ['a@a-patches.csv', 'b@b-patches.csv', 'github.sqlite']
+
+
+def test_resume_interrupted_extraction(tmpdir):
+    filename = str(tmpdir.join('rows.csv'))
+    items = ['%02d' % k for k in range(10)]
+    batches = []
+
+    def fetch(batch, fail_at=None):
+        if len(batches) == fail_at:
+            raise RuntimeError('interrupted')
+        batches.append(batch)
+        return [(item, int(item) * 2) for item in batch]
+
+    with pytest.raises(RuntimeError):
+        extraction.write_batches(filename, ['item', 'value'], items, 3,
+                                 functools.partial(fetch, fail_at=2))
+    assert not os.path.exists(filename)
+    assert os.path.exists(filename + extraction.CHECKPOINT_EXTENSION)
+
+    extraction.write_batches(filename, ['item', 'value'], items, 3, fetch)
+
+    assert batches[2:] == [['06', '07', '08'], ['09']]
+    actual = pd.read_csv(filename, dtype={'item': str})
+    assert actual['item'].tolist() == items
+    assert actual['value'].tolist() == [k * 2 for k in range(10)]
+    assert not os.path.exists(filename + extraction.CHECKPOINT_EXTENSION)
+
+
+def test_restart_extraction_of_other_items(tmpdir):
+    filename = str(tmpdir.join('rows.csv'))
+
+    def fetch(batch):
+        if '00' in batch:
+            raise RuntimeError('interrupted')
+        return [(item,) for item in batch]
+
+    with pytest.raises(RuntimeError):
+        extraction.write_batches(filename, ['item'], ['02', '00'], 1, fetch)
+    extraction.write_batches(filename, ['item'], ['01', '02'], 1, fetch)
+
+    assert pd.read_csv(filename, dtype=str)['item'].tolist() == ['01', '02']
+
+
+def test_run_names_failed_task(database):
+    def fail(conn, project):
+        raise ValueError(project)
+
+    with pytest.raises(executor.TaskError, match='b/b'):
+        extraction.run(fail, [('b/b', ('b/b',))], connect=database)
+
+
+def test_filter_jobs_queries(database):
+    with database() as conn:
+        assert filter_jobs.query_offenders(conn, 'a/a')['tr_job_id'].tolist() == [3]
+        assert filter_jobs.query_offenders(conn, 'b/b')['tr_job_id'].tolist() == [4]
+        assert filter_jobs.query_pull_requests(conn, 'a/a')['tr_job_id'].tolist() == [2]
+        assert filter_jobs.query_pull_requests(conn, 'b/b')['tr_job_id'].tolist() == [4]
@@ -0,0 +1,97 @@
+# -*- encoding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from testmining import cache, failure_distance, folders
+from testmining.apfd import read_tests
+
+from tests.notebooks import output_sample
+
+
+def test_builds_are_read_per_project_once(tmpdir, monkeypatch):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, output_sample())
+    monkeypatch.setattr(folders, 'cache_folder', lambda: str(tmpdir))
+    reads = []
+    original = cache.read
+
+    def read(key, **kwargs):
+        reads.append(kwargs['where'])
+        return original(key, **kwargs)
+
+    monkeypatch.setattr(cache, 'read', read)
+    failure_distance.project_builds.cache_clear()
+
+    for _ in range(2):
+        timestamps = failure_distance.build_timestamps('square@okhttp')
+
+    assert reads == [{'gh_project_name': 'square/okhttp'}]
+    assert timestamps.index.name == 'tr_build_number'
+    assert (timestamps['end'] >= timestamps['begin']).all()
+
+
+def quadratic_failure_distance(builds, build_ts):
+    """The former implementation, which scans all prior builds for every build."""
+    build_numbers = builds.index.unique().sort_values(ascending=False)
+    build_ts = build_ts.sort_index(ascending=False)
+    rows = []
+    for index, build_number in enumerate(build_numbers):
+        red_tests = set(builds.loc[build_number]['testName'])
+        distance = {}
+        begin = pd.Series(build_ts.loc[build_number]['begin']).min()
+        for prior_index in range(index + 1, len(builds)):
+            prior_build_number = build_numbers[prior_index]
+            if pd.Series(build_ts.loc[prior_build_number]['end']).max() > begin:
+                continue
+            for test in set(builds.loc[prior_build_number]['testName']):
+                if test in red_tests:
+                    distance[test] = prior_index - index
+                    red_tests.remove(test)
+            if not red_tests:
+                break
+        for test in red_tests:
+            distance[test] = np.nan
+        rows.append((builds.loc[build_number]['travisBuildId'],
+                     failure_distance.min_nan(distance.values())))
+    return pd.DataFrame(rows, columns=['travisBuildId', 'distance'])
+
+
+def random_builds(seed, count=150):
+    rng = np.random.RandomState(seed)
+    numbers = np.arange(1, count + 1)
+    failed = pd.DataFrame({
+        'travisBuildId': (numbers * 10).astype(np.int32),
+        'testName': [list(rng.choice(['T%d' % k for k in range(20)], 1 + rng.poisson(1)))
+                     for _ in numbers],
+    }, index=pd.Index(numbers, name='travisBuildNumber'))
+
+    # Some build numbers are assigned twice, and builds overlap
+    ts_numbers = np.concatenate([numbers, rng.choice(numbers, count // 10)])
+    offsets = ts_numbers * 600 + rng.randint(0, 3000, len(ts_numbers))
+    begin = pd.Timestamp('2017-01-01') + pd.to_timedelta(offsets, unit='s')
+    end = begin + pd.to_timedelta(rng.randint(60, 4000, len(ts_numbers)), unit='s')
+    build_ts = pd.DataFrame({'begin': begin, 'end': end},
+                            index=pd.Index(ts_numbers, name='tr_build_number'))
+    build_ts.iloc[rng.choice(len(build_ts), 5), 1] = pd.NaT
+    build_ts.iloc[rng.choice(len(build_ts), 5), 0] = pd.NaT
+    return failed, build_ts
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_failure_distance_matches_quadratic_scan(monkeypatch, seed):
+    builds, build_ts = random_builds(seed)
+    monkeypatch.setattr(failure_distance, 'build_timestamps', lambda project_name: build_ts)
+
+    pd.testing.assert_frame_equal(failure_distance.failure_distances('p', builds),
+                                  quadratic_failure_distance(builds, build_ts))
+
+
+def test_failure_distance_sample(monkeypatch, tmpdir):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, output_sample())
+    monkeypatch.setattr(folders, 'cache_folder', lambda: str(tmpdir))
+    untreated = read_tests(folders.strategy(folders.project('neuland@jade4j'), 'untreated'))
+    builds = failure_distance.failed_builds(untreated)
+    build_ts = failure_distance.build_timestamps('neuland@jade4j')
+
+    pd.testing.assert_frame_equal(failure_distance.failure_distances('neuland@jade4j', builds),
+                                  quadratic_failure_distance(builds, build_ts))
@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from testmining import filter_jobs, folders, loader, synthetic
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'synthetic@project0'
+
+
+@pytest.fixture()
+def base(base):
+    result = CliRunner().invoke(synthetic.main, ['--projects', '1', '--builds', '80',
+                                                 '--tests', '30', '--failure-rate', '0.5',
+                                                 '--no-apfd'])
+    assert result.exit_code == 0, result.output
+    return base
+
+
+def test_local_offenders_match_query(base):
+    project_path = folders.project(PROJECT)
+    dump = loader.read_dump(folders.travis_torrent())
+    untreated = loader.read_strategy(folders.strategy(project_path, 'untreated'))
+
+    conn = sqlite3.connect(str(base.join('github.sqlite')))
+    dump[['tr_job_id', 'gh_project_name', 'tr_build_number', 'gh_is_pr']] \
+        .to_sql('travistorrent_8_2_2017', conn, index=False)
+    untreated[['travisJobId', 'failures', 'errors']].rename(columns={'travisJobId': 'tr_job_id'}) \
+        .to_sql('tr_test_result', conn, index=False)
+    expected = filter_jobs.query_offenders(conn, PROJECT)
+    conn.close()
+    expected = expected.sort_values('tr_job_id', ignore_index=True)
+
+    actual = filter_jobs.local_offenders(PROJECT, project_path)
+    assert len(actual) > 0
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.read_csv(folders.offenders(project_path)), expected,
+                                  check_dtype=False)
+
+
+@pytest.mark.usefixtures('base')
+def test_local_offenders_from_partitions():
+    project_path = folders.project(PROJECT)
+    expected = filter_jobs.local_offenders(PROJECT, project_path)
+
+    loader.write_partitions(folders.travis_torrent())
+    os.remove(folders.travis_torrent())
+
+    pd.testing.assert_frame_equal(filter_jobs.local_offenders(PROJECT, project_path), expected,
+                                  check_dtype=False)
+    shutil.rmtree(folders.partitions(folders.travis_torrent()))
+    with pytest.raises(FileNotFoundError, match='dump'):
+        filter_jobs.local_offenders(PROJECT, project_path)
+
+
+@pytest.mark.usefixtures('base')
+def test_offenders_command_without_database():
+    offenders = folders.offenders(folders.project(PROJECT))
+    expected = pd.read_csv(offenders)
+
+    result = CliRunner().invoke(filter_jobs.main, ['offenders', '--local', '--force'])
+
+    assert result.exit_code == 0, result.output
+    pd.testing.assert_frame_equal(pd.read_csv(offenders), expected)
@@ -0,0 +1,76 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from testmining import folders, history
+
+from tests.notebooks import output_sample
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'neuland@jade4j'
+
+
+@pytest.fixture()
+def project(tmpdir, monkeypatch):
+    source = os.path.join(output_sample(), PROJECT, 'baseline', 'jade4j@untreated.csv')
+    target = tmpdir.join(PROJECT, 'baseline')
+    target.ensure(dir=True)
+    shutil.copy(source, str(target))
+    shutil.copy(os.path.join(output_sample(), 'cache.hd5'), str(tmpdir))
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    return str(tmpdir.join(PROJECT))
+
+
+@pytest.fixture()
+def failed():
+    df = pd.read_csv(os.path.join(output_sample(), PROJECT, 'baseline', 'jade4j@untreated.csv'))
+    builds = np.sort(df['travisBuildNumber'].unique())
+    df = df[(df['failures'] + df['errors']) > 0]
+    return builds, df.groupby('testName')['travisBuildNumber'].apply(lambda s: sorted(set(s)))
+
+
+def queries(builds, failed):
+    tests = np.repeat(failed.index.to_numpy(), len(builds))
+    numbers = np.tile(builds, len(failed))
+    return (np.append(tests, ['unknown', failed.index[0]]),
+            np.append(numbers, [builds[-1], builds[-1] + 100]))
+
+
+def test_queries_match_scan(project, failed):
+    builds, failed_builds = failed
+    index = history.load(PROJECT, project)
+    assert os.path.exists(folders.failure_history(project))
+
+    tests, numbers = queries(builds, failed_builds)
+    previous = index.previous_failure(tests, numbers)
+    streaks = index.streaks(tests, numbers)
+    counts = index.counts(tests, numbers, window=5)
+
+    position = {number: k for k, number in enumerate(builds)}
+    for test, number, prev, streak, count in zip(tests, numbers, previous, streaks, counts):
+        failures = [b for b in failed_builds.get(test, []) if b < number]
+        assert prev == (failures[-1] if failures else history.NO_FAILURE)
+
+        current = np.searchsorted(builds, number)
+        assert count == sum(1 for b in failures if position[b] >= current - 5)
+
+        expected = 0
+        while expected < len(failures) \
+                and position[failures[-1 - expected]] == current - 1 - expected:
+            expected += 1
+        assert streak == expected
+
+
+def test_timestamps_and_reload(project):
+    index = history.load(PROJECT, project)
+    failures = index.failures(index.tests[0])
+    assert not failures.empty
+    assert failures['timestamp'].notna().all()
+
+    reloaded = history.FailureHistory.load(folders.failure_history(project))
+    np.testing.assert_array_equal(reloaded.streak, index.streak)
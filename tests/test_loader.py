@@ -0,0 +1,167 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from testmining import folders, loader
+
+from tests.notebooks import output_sample
+
+
+def untreated():
+    return os.path.join(output_sample(), 'neuland@jade4j', 'baseline',
+                        'jade4j@untreated.csv')
+
+
+def test_read_strategy_schema():
+    tests = loader.read_strategy(untreated())
+
+    assert list(tests.columns) == list(loader.STRATEGY_DTYPES)
+    assert tests['testName'].dtype.name == 'category'
+    assert tests['count'].dtype == np.int32
+    assert tests['duration'].dtype == np.float32
+
+
+def test_read_strategy_projection():
+    tests = loader.read_strategy(untreated(), ['testName', 'travisJobId'])
+
+    assert list(tests.columns) == ['testName', 'travisJobId']
+
+
+def test_read_strategy_chunks():
+    chunks = list(loader.read_strategy(untreated(), ['travisJobId'], chunksize=1000))
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert sum(map(len, chunks)) == len(loader.read_strategy(untreated()))
+
+
+def test_read_strategy_columnar(tmpdir):
+    filename = str(tmpdir.join('jade4j@untreated.csv'))
+    shutil.copy(untreated(), filename)
+    expected = loader.read_strategy(filename, ['testName', 'travisJobId', 'count'])
+
+    loader.write_columnar(filename)
+    actual = loader.read_strategy(filename, ['testName', 'travisJobId', 'count'])
+
+    assert folders.fresh_columnar(filename)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_read_strategy_outdated_columnar(tmpdir):
+    filename = str(tmpdir.join('jade4j@untreated.csv'))
+    shutil.copy(untreated(), filename)
+    loader.write_columnar(filename)
+
+    os.utime(filename, (time.time() + 10, time.time() + 10))
+
+    assert folders.fresh_columnar(filename) is None
+
+
+def test_read_strategy_columnar_chunks(tmpdir):
+    filename = str(tmpdir.join('jade4j@untreated.csv'))
+    shutil.copy(untreated(), filename)
+    loader.write_columnar(filename)
+
+    chunks = list(loader.read_strategy(filename, ['travisJobId'], chunksize=1000))
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks),
+                                  loader.read_strategy(filename, ['travisJobId']))
+
+
+def dump():
+    return os.path.join(output_sample(), 'travistorrent_8_2_2017.csv')
+
+
+def test_read_jobs_compact_schema():
+    columns = ['tr_job_id', 'gh_project_name', 'tr_log_bool_tests_failed']
+    jobs = loader.read_jobs(dump(), columns=columns, chunksize=7)
+    assert list(jobs.columns) == columns
+    assert list(jobs.columns) == ['tr_job_id', 'gh_project_name', 'tr_log_bool_tests_failed']
+    assert jobs['gh_project_name'].dtype.name == 'category'
+    assert list(jobs['gh_project_name'].cat.categories) == sorted(jobs['gh_project_name'].unique())
+    assert jobs['tr_log_bool_tests_failed'].dtype.name == 'boolean'
+    assert jobs['tr_log_bool_tests_failed'].isna().any()
+
+
+def test_read_jobs_with_commits():
+    expected = loader.read_dump(dump())
+    jobs, commits = loader.read_jobs(dump(), columns=['tr_job_id'], chunksize=7, with_commits=True)
+
+    assert list(jobs.columns) == ['tr_job_id']
+    assert commits['git_commit'].dtype.name == 'category'
+    lists = commits.groupby('tr_job_id')['git_commit'].agg(list).reindex(jobs['tr_job_id'])
+    assert lists.tolist() == expected['git_all_built_commits'].tolist()
+
+
+def test_read_jobs_from_partitions(tmpdir):
+    filename = str(tmpdir.join('travistorrent.csv'))
+    shutil.copy(dump(), filename)
+    columns = ['tr_build_id', 'gh_project_name', 'gh_is_pr', 'gh_build_started_at', 'tr_duration']
+    where = {'gh_project_name': ['rails/rails', 'myronmarston/vcr']}
+    expected, expected_commits = loader.read_jobs(filename, columns, where=where, with_commits=True)
+
+    loader.write_partitions(filename, chunksize=13)
+    assert folders.fresh_partitions(filename)
+    assert len(tmpdir.join('travistorrent.parquet').listdir()) == 12
+
+    jobs, commits = loader.read_jobs(filename, columns, where=where, with_commits=True)
+    order = ['gh_project_name', 'tr_build_id']
+    pd.testing.assert_frame_equal(jobs.sort_values(order, kind='stable').reset_index(drop=True),
+                                  expected.sort_values(order, kind='stable').reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+    assert sorted(commits['git_commit']) == sorted(expected_commits['git_commit'])
+
+
+def test_read_jobs_ignores_outdated_partitions(tmpdir):
+    filename = str(tmpdir.join('travistorrent.csv'))
+    shutil.copy(dump(), filename)
+    loader.write_partitions(filename)
+
+    later = time.time() + 10
+    os.utime(filename, (later, later))
+    assert folders.fresh_partitions(filename) is None
+
+
+def test_partitions_are_no_project(tmpdir, monkeypatch):
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    shutil.copy(dump(), folders.travis_torrent())
+    loader.write_partitions(folders.travis_torrent())
+    tmpdir.mkdir('owner@repository')
+
+    assert [name for name, _ in folders.projects()] == ['owner@repository']
+
+
+def test_split_commits_of_jobs_without_commits():
+    jobs = pd.DataFrame({
+        'tr_build_id': [1, 2, 2, 3],
+        'tr_job_id': [10, 20, 21, 30],
+        'git_all_built_commits': [np.nan, 'a#b', 'c', np.nan],
+    })
+    expected = pd.DataFrame({
+        'tr_build_id': [2, 2, 2],
+        'tr_job_id': [20, 20, 21],
+        'git_commit': pd.Categorical(['a', 'b', 'c']),
+    })
+
+    pd.testing.assert_frame_equal(loader.split_commits(jobs), expected)
+    jobs['git_all_built_commits'] = [np.nan, ['a', 'b'], ['c'], np.nan]
+    pd.testing.assert_frame_equal(loader.split_commits(jobs), expected)
+    assert loader.split_commits(jobs.iloc[[0, 3]]).empty
+
+
+def test_read_jobs_with_missing_commits(tmpdir):
+    filename = str(tmpdir.join('travistorrent.csv'))
+    dump_jobs = pd.read_csv(dump(), dtype=str)
+    dump_jobs.loc[[0, 7, 8], 'git_all_built_commits'] = np.nan
+    dump_jobs.to_csv(filename, index=False)
+
+    _, commits = loader.read_jobs(filename, columns=['tr_job_id'], chunksize=7, with_commits=True)
+
+    missing = dump_jobs.loc[[0, 7, 8], 'tr_job_id'].astype(np.int64)
+    assert not commits['tr_job_id'].isin(missing).any()
+    assert commits['git_commit'].str.len().eq(40).all()
+    assert len(commits) == dump_jobs['git_all_built_commits'].str.split('#').str.len().sum()
@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from testmining import apfd, folders, loader, permutation
+
+from tests.notebooks import output_sample
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'neuland@jade4j'
+
+STRATEGIES = ['untreated', 'random', 'optimal-failure']
+
+
+@pytest.fixture()
+def project(tmpdir, monkeypatch):
+    source = os.path.join(output_sample(), PROJECT, 'baseline')
+    path = tmpdir.join(PROJECT)
+    target = path.join('baseline')
+    target.ensure(dir=True)
+    for strategy in STRATEGIES:
+        filename = 'jade4j@%s.csv' % strategy
+        shutil.copy(os.path.join(source, filename), str(target.join(filename)))
+    monkeypatch.setenv(folders.ENV_BASE_FOLDER, str(tmpdir))
+    return str(path)
+
+
+def expected(strategy):
+    return loader.read_strategy(os.path.join(output_sample(), PROJECT, 'baseline',
+                                             'jade4j@%s.csv' % strategy))
+
+
+def test_encode_project_reconstructs_order(project):
+    permutation.encode_project(PROJECT, project, remove_csv=True)
+
+    assert [name for name, _ in folders.strategies(project)] == sorted(STRATEGIES)
+    for strategy in STRATEGIES:
+        filename = folders.strategy(project, strategy)
+        assert not os.path.exists(filename)
+        pd.testing.assert_frame_equal(loader.read_strategy(filename), expected(strategy),
+                                      check_categorical=False)
+
+
+def test_encode_project_chunks(project):
+    permutation.encode_project(PROJECT, project, remove_csv=True)
+    filename = folders.strategy(project, 'random')
+
+    chunks = loader.read_strategy(filename, ['travisJobId', 'index'], chunksize=1000)
+
+    pd.testing.assert_frame_equal(pd.concat(chunks),
+                                  expected('random')[['travisJobId', 'index']])
+
+
+def test_apfd_from_permutation(project):
+    permutation.encode_project(PROJECT, project, remove_csv=True)
+
+    actual = apfd.from_file(folders.strategy(project, 'optimal-failure'))
+
+    reference = os.path.join(output_sample(), PROJECT, 'baseline', 'jade4j@optimal-failure.csv')
+    pd.testing.assert_series_equal(actual, apfd.from_file(reference))
+
+
+def test_encode_rejects_other_executions():
+    tests = expected('untreated')
+    canonical = tests.drop(columns='index')
+    other = tests.copy()
+    other.loc[0, 'failures'] += 1
+
+    with pytest.raises(AssertionError):
+        permutation.encode(canonical, other)
+
+
+def test_keep_csv_which_differs_from_store(project):
+    permutation.encode_project(PROJECT, project)
+    filename = folders.strategy(project, 'random')
+    stat = os.stat(filename)
+    tests = pd.read_csv(filename)
+    tests.loc[0, 'duration'] += 1
+    tests.to_csv(filename, index=False)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    with pytest.raises(ValueError, match='random'):
+        permutation.encode_project(PROJECT, project, remove_csv=True)
+    assert os.path.exists(filename)
+
+
+def test_rebuild_keeps_strategies_without_csv(project):
+    permutation.encode_project(PROJECT, project, remove_csv=True)
+    untreated = folders.strategy(project, 'untreated')
+    shutil.copy(os.path.join(output_sample(), PROJECT, 'baseline', 'jade4j@untreated.csv'),
+                untreated)
+    table = folders.executions(untreated)
+    os.utime(untreated, ns=(os.stat(table).st_atime_ns, os.stat(table).st_mtime_ns + 10 ** 9))
+
+    permutation.encode_project(PROJECT, project)
+
+    for strategy in STRATEGIES:
+        pd.testing.assert_frame_equal(loader.read_strategy(folders.strategy(project, strategy)),
+                                      expected(strategy), check_categorical=False)
@@ -0,0 +1,58 @@
+# -*- encoding: utf-8 -*-
+import io
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from testmining import cache, folders, loader, synthetic
+
+# pragma pylint: disable=redefined-outer-name
+
+PROJECT = 'synthetic@project0'
+
+
+@pytest.fixture()
+def base(base):
+    result = CliRunner().invoke(synthetic.main, ['--projects', '1', '--builds', '60',
+                                                 '--tests', '30', '--seed', '7'])
+    assert result.exit_code == 0, result.output
+    return str(base)
+
+
+def test_strategies_are_permutations(base):
+    strategies = dict(folders.strategies(folders.project(PROJECT)))
+    assert set(strategies) == set(synthetic.STRATEGIES)
+
+    def key(df):
+        columns = ['travisJobId', 'testName', 'failures']
+        return df.sort_values(columns[:2])[columns].reset_index(drop=True)
+
+    untreated = loader.read_strategy(strategies['untreated'])
+    assert not untreated.empty
+    for filename in strategies.values():
+        pd.testing.assert_frame_equal(key(loader.read_strategy(filename)), key(untreated))
+
+
+def test_writes_evaluation_and_aggregates(base):
+    apfd = folders.apfd(folders.project(PROJECT))
+    assert pd.read_csv(apfd)['optimal-failure'].median() > 0.9
+
+    dump = loader.read_dump(folders.travis_torrent())
+    assert set(dump.gh_project_name) == {'synthetic/project0'}
+    assert set(cache.read('builds').index) == set(dump.tr_build_id)
+
+
+@pytest.mark.usefixtures('base')
+def test_dump_is_independent_of_batches():
+    def dump(batch):
+        output = io.StringIO()
+        settings = synthetic.Settings(builds=30, tests=10, failure_rate=0.5, batch=batch)
+        next_id = synthetic.generate_project(PROJECT, settings, 3, 1000, output)
+        return output.getvalue(), next_id
+
+    batched, next_id = dump(4)
+    assert (batched, next_id) == dump(1000)
+    jobs = pd.read_csv(io.StringIO(batched), header=None, names=synthetic.DUMP_COLUMNS)
+    assert jobs['tr_job_id'].is_unique and jobs['tr_job_id'].max() < next_id
+    assert jobs['gh_build_started_at'].str.len().eq(len('2013-01-01 00:00:00')).all()